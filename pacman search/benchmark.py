@@ -0,0 +1,340 @@
+# benchmark.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Benchmarks the search functions in search.py on every search problem in
+searchAgents.py that makes sense for each layout in layouts/, without
+graphics, so that performance regressions show up as numbers instead of
+by eye.
+
+Every case (layout, problem, search function, heuristic) is run several
+times.  The path cost, node counts and frontier sizes come from the first
+run, the times are the fastest and the mean of all runs, and the memory is
+the most the peak resident set size of the process grew during a run.
+Each run happens in a forked child process where fork is available, so
+runs don't share memory or caches with each other.
+
+To run everything and keep the results as a baseline:
+
+  > python benchmark.py --save-baseline baseline.json
+
+To compare a later version of search.py or searchAgents.py against it:
+
+  > python benchmark.py --baseline baseline.json
+
+The results can also be written as a table for other tools:
+
+  > python benchmark.py -l tinyMaze,mediumMaze -f bfs,astar -o results.csv
+"""
+
+import optparse
+import os
+import sys
+import time
+import cPickle
+import json
+import layout
+import pacman
+import search
+import searchAgents
+import textDisplay
+import util
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROBLEMS = ['PositionSearchProblem', 'CornersProblem', 'FoodSearchProblem', 'AnyFoodSearchProblem']
+FUNCTIONS = ['bfs', 'dfs', 'ucs', 'astar']
+
+# The heuristics A* is run with for each problem
+HEURISTICS = {
+    'PositionSearchProblem': ['nullHeuristic', 'manhattanHeuristic', 'euclideanHeuristic'],
+    'CornersProblem': ['nullHeuristic', 'cornersHeuristic'],
+    'FoodSearchProblem': ['nullHeuristic', 'foodHeuristic', 'mstFoodHeuristic'],
+    'AnyFoodSearchProblem': ['nullHeuristic'],
+}
+
+# The columns printed for each case: (title, key, format)
+COLUMNS = [('layout', 'layout', '%s'), ('problem', 'problem', '%s'),
+           ('function', 'function', '%s'), ('heuristic', 'heuristic', '%s'),
+           ('status', 'status', '%s'), ('cost', 'pathCost', '%d'),
+           ('expanded', 'expanded', '%d'), ('frontier', 'peakFrontier', '%d'),
+           ('time', 'minTime', '%.4f'), ('memory', 'peakMemory', '%d')]
+
+def isCompatible(problemName, lay):
+    """
+    Returns whether the problem can be posed on the layout: position search
+    looks for (1,1), the corners problem needs four distinct open corners and
+    the food problems need some food.
+    """
+    walls = lay.walls
+    if problemName == 'PositionSearchProblem':
+        return not walls[1][1]
+    if problemName == 'CornersProblem':
+        top, right = walls.height - 2, walls.width - 2
+        corners = set([(1, 1), (1, top), (right, 1), (right, top)])
+        return len(corners) == 4 and not [c for c in corners if walls[c[0]][c[1]]]
+    return lay.food.count() > 0
+
+def makeProblem(problemName, gameState):
+    if problemName == 'PositionSearchProblem':
+        return searchAgents.PositionSearchProblem(gameState, warn=False, visualize=False)
+    return getattr(searchAgents, problemName)(gameState)
+
+def lookup(name):
+    "Finds a search function or heuristic the same way SearchAgent does."
+    if hasattr(searchAgents, name):
+        return getattr(searchAgents, name)
+    if hasattr(search, name):
+        return getattr(search, name)
+    raise AttributeError, name + ' is not a search function or heuristic in searchAgents.py or search.py.'
+
+def getCases(layoutNames, problemNames, functionNames):
+    """
+    Returns every (layout name, layout, problem, function, heuristic) to run.
+    The heuristic is '' for the uninformed search functions.
+    """
+    cases = []
+    for layoutName in layoutNames:
+        lay = layout.getLayout(layoutName)
+        if lay == None: raise Exception, 'The layout ' + layoutName + ' cannot be found'
+        for problemName in problemNames:
+            if not isCompatible(problemName, lay): continue
+            for functionName in functionNames:
+                if 'heuristic' in lookup(functionName).func_code.co_varnames:
+                    for heuristicName in HEURISTICS[problemName]:
+                        cases.append((layoutName, lay, problemName, functionName, heuristicName))
+                else:
+                    cases.append((layoutName, lay, problemName, functionName, ''))
+    return cases
+
+def peakMemory():
+    "The peak resident set size of this process so far (kB on Linux), or 0."
+    if resource == None: return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def runOnce(lay, problemName, functionName, heuristicName, timeout):
+    """
+    Solves one case and returns a dictionary describing the run.  The status
+    is 'ok', 'timeout' or the exception the search raised.
+    """
+    gameState = pacman.GameState()
+    gameState.initialize(lay, 0)
+    function = lookup(functionName)
+    util.mutePrint()
+    try:
+        try:
+            problem = makeProblem(problemName, gameState)
+            if heuristicName:
+                heuristic = lookup(heuristicName)
+                solve = lambda: function(problem, heuristic=heuristic)
+            else:
+                solve = lambda: function(problem)
+            search.lastMetrics = None
+            search.collectMetrics = True
+            startMemory = peakMemory()
+            startTime = time.time()
+            actions = util.TimeoutFunction(solve, timeout)()
+            elapsed = time.time() - startTime
+        except util.TimeoutFunctionException:
+            return {'status': 'timeout'}
+        except Exception, e:
+            return {'status': '%s: %s' % (e.__class__.__name__, e)}
+    finally:
+        util.unmutePrint()
+
+    run = {'status': 'ok', 'time': elapsed, 'memory': peakMemory() - startMemory,
+           'pathCost': problem.getCostOfActions(actions)}
+    if search.lastMetrics != None:
+        metrics = search.lastMetrics
+        run.update({'expanded': metrics.nodesExpanded, 'generated': metrics.nodesGenerated,
+                    'peakFrontier': metrics.peakFrontier, 'peakClosed': metrics.peakClosed})
+    if '_expanded' in dir(problem): run['expanded'] = problem._expanded
+    return run
+
+def runIsolated(function, *args):
+    """
+    Calls function(*args) in a forked child process and returns its result,
+    which must be picklable, so that every run starts from the memory of
+    this process instead of whatever the last run left behind.  Where fork
+    is not available the function is called in this process.
+    """
+    if not hasattr(os, 'fork'):
+        return function(*args)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        f = os.fdopen(write, 'wb')
+        try:
+            cPickle.dump(function(*args), f, cPickle.HIGHEST_PROTOCOL)
+            f.close()
+        finally:
+            os._exit(0)
+    os.close(write)
+    f = os.fdopen(read, 'rb')
+    try:
+        return cPickle.load(f)
+    except EOFError:
+        return {'status': 'crashed'}
+    finally:
+        f.close()
+        os.waitpid(pid, 0)
+
+def runCase(case, repeat, timeout):
+    "Runs a case repeat times and summarizes the runs in one result."
+    layoutName, lay, problemName, functionName, heuristicName = case
+    result = {'layout': layoutName, 'problem': problemName,
+              'function': functionName, 'heuristic': heuristicName}
+    runs = []
+    for i in range(repeat):
+        run = runIsolated(runOnce, lay, problemName, functionName, heuristicName, timeout)
+        if run['status'] != 'ok':
+            #a case that times out once would time out every time
+            result['status'] = run['status']
+            return result
+        runs.append(run)
+    times = [run['time'] for run in runs]
+    result.update(runs[0])
+    del result['time'], result['memory']
+    result.update({'runs': len(runs), 'minTime': min(times),
+                   'meanTime': sum(times) / len(times),
+                   'peakMemory': max([run['memory'] for run in runs])})
+    return result
+
+def caseKey(result):
+    return (result['layout'], result['problem'], result['function'], result['heuristic'])
+
+def describe(result):
+    return ' '.join([part for part in caseKey(result) if part])
+
+def compareResults(results, baseline, tolerance):
+    """
+    Compares results against baseline results of the same cases and returns
+    a list of (kind, result, message) for every difference worth reporting,
+    where kind is 'regression' or 'improvement'.
+
+    Path costs, statuses and node counts are deterministic, so any change is
+    reported.  Times and memory are noisy, so they are only reported when
+    they change by more than tolerance (a fraction) and a little more than
+    the timer or memory page resolution.
+    """
+    baselineResults = dict([(caseKey(result), result) for result in baseline])
+    changes = []
+    def compare(result, old, key, name, format, minimum):
+        if key not in result or key not in old: return
+        new, before = result[key], old[key]
+        message = '%s %s -> %s' % (name, format % before, format % new)
+        if new > before * (1 + tolerance) and new - before > minimum:
+            changes.append(('regression', result, message))
+        elif new < before * (1 - tolerance) and before - new > minimum:
+            changes.append(('improvement', result, message))
+
+    for result in results:
+        old = baselineResults.get(caseKey(result))
+        if old == None: continue
+        if result['status'] != old['status']:
+            kind = result['status'] == 'ok' and 'improvement' or 'regression'
+            changes.append((kind, result, 'status %s -> %s' % (old['status'], result['status'])))
+            continue
+        if result['status'] != 'ok': continue
+        if result['pathCost'] != old['pathCost']:
+            kind = result['pathCost'] < old['pathCost'] and 'improvement' or 'regression'
+            changes.append((kind, result, 'path cost %s -> %s' % (old['pathCost'], result['pathCost'])))
+        compare(result, old, 'expanded', 'expanded', '%d', 0)
+        compare(result, old, 'minTime', 'time', '%.4f', 0.01)
+        compare(result, old, 'peakMemory', 'memory', '%d', 1024)
+    return changes
+
+def loadResults(filename):
+    f = open(filename)
+    try: return json.load(f)
+    finally: f.close()
+
+def readCommand(argv):
+    usageStr = """
+    USAGE:      python benchmark.py <options>
+    EXAMPLES:   (1) python benchmark.py --save-baseline baseline.json
+                    - runs every case and stores the results as a baseline
+                (2) python benchmark.py -l mediumMaze,bigMaze -b baseline.json
+                    - runs the cases on two layouts and compares them
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-l', '--layouts', dest='layouts', default=None,
+                      help='Comma separated layouts to run on (default: every layout in layouts/)')
+    parser.add_option('-p', '--problems', dest='problems', default=','.join(PROBLEMS),
+                      help='Comma separated search problems to run (default: %default)')
+    parser.add_option('-f', '--functions', dest='functions', default=','.join(FUNCTIONS),
+                      help='Comma separated search functions to run (default: %default)')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=3,
+                      help='Number of times to run each case (default: %default)')
+    parser.add_option('-t', '--timeout', dest='timeout', type='int', default=5,
+                      help='Seconds a single run may take (default: %default)')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='Write the results to this JSON file, or CSV if it ends in .csv')
+    parser.add_option('-b', '--baseline', dest='baseline', default=None,
+                      help='Compare the results against a JSON file saved with --save-baseline')
+    parser.add_option('--save-baseline', dest='saveBaseline', default=None,
+                      help='Save the results as a baseline JSON file')
+    parser.add_option('--tolerance', dest='tolerance', type='float', default=0.5,
+                      help='Fraction time and memory may grow before it counts as a regression (default: %default)')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+def runBenchmark(options):
+    """
+    Runs the benchmark described by the command line options.  Returns the
+    number of regressions against the baseline.
+    """
+    import __main__
+    __main__.__dict__['_display'] = textDisplay.NullGraphics()
+
+    if options.layouts:
+        layoutNames = options.layouts.split(',')
+    else:
+        layoutNames = sorted([name[:-len('.lay')] for name in os.listdir('layouts') if name.endswith('.lay')])
+    cases = getCases(layoutNames, options.problems.split(','), options.functions.split(','))
+
+    results = []
+    for i, case in enumerate(cases):
+        result = runCase(case, options.repeat, options.timeout)
+        results.append(result)
+        print '[%d/%d] %s: %s' % (i + 1, len(cases), describe(result), result['status'])
+    print
+    print util.formatTable(results, COLUMNS)
+
+    if options.output:
+        pacman.writeMetrics(results, options.output)
+    if options.saveBaseline:
+        pacman.writeMetrics(results, options.saveBaseline)
+    if not options.baseline:
+        return 0
+
+    changes = compareResults(results, loadResults(options.baseline), options.tolerance)
+    regressions = [change for change in changes if change[0] == 'regression']
+    print
+    print 'Compared with %s: %d regressions, %d improvements' % \
+        (options.baseline, len(regressions), len(changes) - len(regressions))
+    for kind, result, message in changes:
+        print '  %-11s %s: %s' % (kind, describe(result), message)
+    return len(regressions)
+
+if __name__ == '__main__':
+    options = readCommand(sys.argv[1:])
+    regressions = runBenchmark(options)
+    sys.exit(regressions > 0 and 1 or 0)
@@ -24,6 +24,7 @@ from util import *
 import time, os
 import traceback
 import sys
+import random
 
 #######################
 # Parts worth reading #
@@ -35,7 +36,17 @@ class Agent:
     following methods which will be called if they exist:
 
     def registerInitialState(self, state): # inspects the starting state
+
+    An agent that never changes the states it is given (only reads them and
+    generates successors) can set readOnlyObservations to True, and then
+    fast games (see Game.runFast) hand it the game state without copying it.
+
+    pacman.py --metrics sets collectMetrics on the agents of its games, for
+    agents whose statistics cost something to collect.
     """
+    readOnlyObservations = False
+    collectMetrics = False
+
     def __init__(self, index=0):
         self.index = index
 
@@ -67,14 +78,17 @@ class Directions:
                WEST: EAST,
                STOP: STOP}
 
-class Configuration:
+class Configuration(object):
     """
     A Configuration holds the (x,y) coordinate of a character, along with its
     traveling direction.
 
     The convention for positions, like a graph, is that (0,0) is the lower left corner, x increases
     horizontally and y increases vertically.  Therefore, north is the direction of increasing y, or (0,1).
+
+    Configurations are shared between states, so treat them as read-only.
     """
+    __slots__ = ('pos', 'direction')
 
     def __init__(self, pos, direction):
         self.pos = pos
@@ -117,10 +131,14 @@ class Configuration:
             direction = self.direction # There is no stop direction
         return Configuration((x + dx, y+dy), direction)
 
-class AgentState:
+class AgentState(object):
     """
     AgentStates hold the state of an agent (configuration, speed, scared, etc).
+
+    A successor GameState shares the AgentStates of its predecessor except
+    for the ones that changed (see GameStateData.modifiableAgentState).
     """
+    __slots__ = ('start', 'configuration', 'isPacman', 'scaredTimer', 'numCarrying', 'numReturned')
 
     def __init__( self, startConfiguration, isPacman ):
         self.start = startConfiguration
@@ -145,7 +163,9 @@ class AgentState:
         return hash(hash(self.configuration) + 13 * hash(self.scaredTimer))
 
     def copy( self ):
-        state = AgentState( self.start, self.isPacman )
+        state = AgentState.__new__( AgentState )
+        state.start = self.start
+        state.isPacman = self.isPacman
         state.configuration = self.configuration
         state.scaredTimer = self.scaredTimer
         state.numCarrying = self.numCarrying
@@ -159,21 +179,53 @@ class AgentState:
     def getDirection(self):
         return self.configuration.getDirection()
 
+class _GridColumn(bytearray):
+    """
+    One column of a Grid: a bytearray of 0s and 1s that forgets the hash of
+    its Grid whenever one of its cells is written.  Reads are plain bytearray
+    indexing.
+    """
+    __slots__ = ('cache',)
+
+    def __setitem__(self, y, value):
+        bytearray.__setitem__(self, y, value)
+        self.cache[0] = None
+
+def _newColumn(values, cache):
+    column = _GridColumn(values)
+    column.cache = cache
+    return column
+
+# Turn the cells of a packed Grid into binary digits and back
+_CELLS_TO_DIGITS = ''.join([chr(i) for i in range(256)]).replace('\x00', '0').replace('\x01', '1')
+_DIGITS_TO_CELLS = ''.join([chr(i) for i in range(256)]).replace('0', '\x00').replace('1', '\x01')
+# Print cells as F and T, and any single characters stored in them as themselves
+_CELLS_TO_STR = 'FT' + ''.join([chr(i) for i in range(2, 256)])
+
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
-    via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
-    y vertical and the origin (0,0) in the bottom left corner.
+    A 2-dimensional array of booleans backed by one bytearray per column.
+    Data is accessed via grid[x][y] where (x,y) are positions on a Pacman map
+    with x horizontal, y vertical and the origin (0,0) in the bottom left
+    corner.  Cells read back as 1 and 0, which compare equal to True and False.
+    A single character can also be stored in a cell (it reads back as its
+    byte value), which is how GameStateData draws the board.
+
+    The hash of a grid is cached until one of its cells is written, so grids
+    can be hashed over and over as parts of search states.
 
     The __str__ method constructs an output that is oriented like a pacman board.
     """
+    CELLS_PER_INT = 30
+
     def __init__(self, width, height, initialValue=False, bitRepresentation=None):
         if initialValue not in [False, True]: raise Exception('Grids can only contain booleans')
-        self.CELLS_PER_INT = 30
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(height)] for x in range(width)]
+        #the cached hash, shared with the columns so that they can clear it
+        self._cache = [None]
+        self.data = [_newColumn([initialValue] * height, self._cache) for x in range(width)]
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
@@ -181,49 +233,63 @@ class Grid:
         return self.data[i]
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        self.data[key] = _newColumn(item, self._cache)
+        self._cache[0] = None
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)] for y in range(self.height)]
+        columns = [str(column).translate(_CELLS_TO_STR) for column in self.data]
+        out = [''.join([column[y] for column in columns]) for y in range(self.height)]
         out.reverse()
-        return '\n'.join([''.join(x) for x in out])
+        return '\n'.join(out)
 
     def __eq__(self, other):
         if other == None: return False
         return self.data == other.data
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        h = self._cache[0]
+        if h is None:
+            #the cells as the bits of one integer, the first cell lowest
+            cells = ''.join([str(column) for column in self.data])
+            h = self._cache[0] = hash(int('0' + cells[::-1].translate(_CELLS_TO_DIGITS), 2))
+        return h
+
+    def __getstate__(self):
+        return self.packBits()
+
+    def __setstate__(self, bits):
+        self.__init__(bits[0], bits[1], bitRepresentation=bits[2:])
 
     def copy(self):
-        g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g = Grid(0, 0)
+        g.width, g.height = self.width, self.height
+        #a copy has the same hash until it is written to
+        g._cache = cache = [self._cache[0]]
+        g.data = [_newColumn(column, cache) for column in self.data]
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
+        g = Grid(0, 0)
+        g.width, g.height = self.width, self.height
+        g._cache = self._cache
         g.data = self.data
         return g
 
     def count(self, item =True ):
-        return sum([x.count(item) for x in self.data])
+        cell = item and '\x01' or '\x00'
+        return sum([column.count(cell) for column in self.data])
 
     def asList(self, key = True):
+        cell = key and '\x01' or '\x00'
         list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key: list.append( (x,y) )
+        for x, column in enumerate(self.data):
+            y = column.find(cell)
+            while y != -1:
+                list.append( (x,y) )
+                y = column.find(cell, y + 1)
         return list
 
     def packBits(self):
@@ -232,17 +298,13 @@ class Grid:
 
         (width, height, bitPackedInts...)
         """
+        cells = ''.join([str(column) for column in self.data]).translate(_CELLS_TO_DIGITS)
+        size = self.CELLS_PER_INT
+        #the cells fill each int from its highest bit, and the last int is
+        #always there even when it is empty
         bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
+        bits += [int(cells[i:i + size].ljust(size, '0'), 2) for i in range(0, len(cells) - size + 1, size)]
+        bits.append(int(cells[len(cells) - len(cells) % size:].ljust(size, '0'), 2))
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
@@ -254,25 +316,16 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
-        for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height: break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
+        cells = ''.join([self._unpackInt(packed, self.CELLS_PER_INT) for packed in bits])
+        cells = cells[:self.width * self.height].ljust(self.width * self.height, '\x00')
+        height = self.height
+        self.data = [_newColumn(cells[x * height:(x + 1) * height], self._cache) for x in range(self.width)]
+        self._cache[0] = None
 
     def _unpackInt(self, packed, size):
-        bools = []
+        "Returns the size lowest bits of packed, highest first, as a string of cells"
         if packed < 0: raise ValueError, "must be a positive integer"
-        for i in range(size):
-            n = 2 ** (self.CELLS_PER_INT - i - 1)
-            if packed >= n:
-                bools.append(True)
-                packed -= n
-            else:
-                bools.append(False)
-        return bools
+        return bin(packed)[2:].rjust(size, '0')[-size:].translate(_DIGITS_TO_CELLS)
 
 def reconstituteGrid(bitRep):
     if type(bitRep) is not type((1,2)):
@@ -349,6 +402,13 @@ class Actions:
     getPossibleActions = staticmethod(getPossibleActions)
 
     def getLegalNeighbors(position, walls):
+        # Layout walls carry its move tables (see Layout.buildMoveTables)
+        tables = getattr(walls, 'moveTables', None)
+        if tables is not None:
+            cell = tables[0].get(position)
+            if cell is not None:
+                cellPositions = tables[1]
+                return [cellPositions[neighbor] for neighbor in tables[2][cell]]
         x,y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
         neighbors = []
@@ -368,21 +428,118 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
-class GameStateData:
+_MASK64 = (1 << 64) - 1
+# Keys mixKey has computed, emptied when it reaches _MIX_KEYS_LIMIT
+_MIX_KEYS = {}
+_MIX_KEYS_LIMIT = 1 << 16
+
+def mixKey( *numbers ):
+    """
+    Returns a 64-bit key for a tuple of integers: each one is mixed in with
+    the SplitMix64 finalizer.  It stands in for a table of random keys where
+    the numbers have no bound.  Recent keys are remembered, since computing
+    one takes a few microseconds.
     """
+    key = _MIX_KEYS.get(numbers)
+    if key is None:
+        key = 0
+        for number in numbers:
+            key = ((key ^ (int(number) & _MASK64)) + 0x9E3779B97F4A7C15) & _MASK64
+            key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+            key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & _MASK64
+            key ^= key >> 31
+        if len(_MIX_KEYS) >= _MIX_KEYS_LIMIT: _MIX_KEYS.clear()
+        _MIX_KEYS[numbers] = key
+    return key
+
+class ZobristKeys:
+    """
+    The random 64-bit keys that Zobrist hashing XORs together for the
+    states of a layout of one size: one for food and one for a capsule on
+    each square, and one for each agent on each half square (scared ghosts
+    move half a square at a time) facing each direction.  They are drawn
+    in a fixed order from one generator with a fixed seed, so they are the
+    same in every process.  Layout.buildZobristKeys shares them between
+    layouts of the same size.
+
+    The score, scared timers and search turns have no bound, so their keys
+    come from mixKey instead of a table.
+    """
+    DIRECTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+    # The first number mixKey gets for each kind of unbounded key
+    SCORE, SCARED, TURN = 1, 2, 3
+
+    def __init__( self, width, height, numAgents ):
+        generator = random.Random(0)
+        self.height = height
+        self.foodKeys = [generator.getrandbits(64) for cell in range(width * height)]
+        self.capsuleKeys = [generator.getrandbits(64) for cell in range(width * height)]
+        self.agentKeys = []
+        for agentIndex in range(numAgents):
+            byDirection = {}
+            for direction in ZobristKeys.DIRECTIONS:
+                byDirection[direction] = [generator.getrandbits(64) for cell in range(4 * width * height)]
+            self.agentKeys.append(byDirection)
+
+    def foodKey( self, x, y ):
+        return self.foodKeys[x * self.height + y]
+
+    def capsuleKey( self, x, y ):
+        return self.capsuleKeys[x * self.height + y]
+
+    def agentKey( self, agentIndex, position, direction, scaredTimer ):
+        x, y = position
+        key = self.agentKeys[agentIndex][direction][int(2 * x + 0.5) * 2 * self.height + int(2 * y + 0.5)]
+        if scaredTimer: key ^= mixKey(ZobristKeys.SCARED, agentIndex, scaredTimer)
+        return key
 
+    def scoreKey( score ):
+        return mixKey(ZobristKeys.SCORE, score)
+    scoreKey = staticmethod(scoreKey)
+
+    def turnKey( agentIndex, depth ):
+        return mixKey(ZobristKeys.TURN, agentIndex, depth)
+    turnKey = staticmethod(turnKey)
+
+class GameStateData(object):
     """
+    The data of one GameState.
+
+    A successor starts out sharing the food grid, the capsule list and the
+    AgentStates of its predecessor; the rules in pacman.py replace whichever
+    of them they change with a copy of its own, so generating a successor
+    only copies what the move actually touched.
+
+    States are hashed with Zobrist hashing: _hash is the XOR of the keys
+    (layout.zobristKeys) of the food left, the capsules left and the agents,
+    and the rules XOR keys out as food and capsules are eaten.  An agent's
+    key is XORed out when modifiableAgentState hands the agent out to be
+    changed, and XORed back in for its new configuration the next time the
+    state is hashed, so hashing never costs more than a few table lookups.
+    """
+    __slots__ = ('food', 'capsules', 'agentStates', 'layout', '_eaten', 'score',
+                 '_foodEaten', '_foodAdded', '_capsuleEaten', '_agentMoved',
+                 '_lose', '_win', 'scoreChange', '_copiedAgents',
+                 '_hash', '_unhashedAgents')
+
     def __init__( self, prevState = None ):
         """
-        Generates a new data packet by copying information from its predecessor.
+        Generates a new data packet that shares the information of its predecessor.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            #bit i is set once agentStates[i] is this state's own copy
+            self._copiedAgents = 0
+            #bit i is set while the key of agent i is missing from _hash
+            self._hash = prevState._hash
+            self._unhashedAgents = prevState._unhashedAgents
+        else:
+            self._copiedAgents = -1
 
         self._foodEaten = None
         self._foodAdded = None
@@ -395,6 +552,9 @@ class GameStateData:
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates( self.agentStates )
+        state._copiedAgents = -1
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -408,6 +568,37 @@ class GameStateData:
             copiedStates.append( agentState.copy() )
         return copiedStates
 
+    def modifiableAgentState( self, agentIndex ):
+        """
+        Returns the AgentState of an agent, first replacing it with a copy if
+        it is still shared with the predecessor state.  Anything that changes
+        an AgentState of a successor has to get it from here.
+        """
+        bit = 1 << agentIndex
+        if not self._unhashedAgents & bit:
+            self._hash ^= self.agentKey( agentIndex )
+            self._unhashedAgents |= bit
+        if not self._copiedAgents & bit:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            self._copiedAgents |= bit
+        return self.agentStates[agentIndex]
+
+    def agentKey( self, agentIndex ):
+        agentState = self.agentStates[agentIndex]
+        configuration = agentState.configuration
+        return self.layout.zobristKeys.agentKey(agentIndex, configuration.pos, configuration.direction, agentState.scaredTimer)
+
+    def zobristHash( self ):
+        """
+        Returns the Zobrist hash of the agents, food and capsules.
+        """
+        if self._unhashedAgents:
+            for agentIndex in range( len( self.agentStates ) ):
+                if self._unhashedAgents & (1 << agentIndex):
+                    self._hash ^= self.agentKey( agentIndex )
+            self._unhashedAgents = 0
+        return self._hash
+
     def __eq__( self, other ):
         """
         Allows two states to be compared.
@@ -424,13 +615,58 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError, e:
-                print e
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        return hash( self.fingerprint() )
+
+    def fingerprint( self ):
+        """
+        Returns a 64-bit Zobrist hash of everything __eq__ compares.  Equal
+        states have equal fingerprints and different states practically never
+        do, so a set of fingerprints counts states.
+        """
+        return self.zobristHash() ^ ZobristKeys.scoreKey(self.score)
+
+    def pack( self ):
+        """
+        Returns everything about the state that changes during a game as a
+        tuple of numbers and strings, a few hundred bytes that are much
+        cheaper to pickle than the state itself.  unpack rebuilds the state
+        from it on the same layout.
+        """
+        agents = tuple([(agentState.start.pos, agentState.configuration.pos, agentState.configuration.direction,
+                         agentState.isPacman, agentState.scaredTimer, agentState.numCarrying, agentState.numReturned)
+                        for agentState in self.agentStates])
+        return (self.food.packBits(), tuple(self.capsules), agents, self.score, self._win, self._lose)
+
+    def unpack( layout, packed ):
+        """
+        Rebuilds the GameStateData that pack returned on layout.
+        """
+        food, capsules, agents, score, win, lose = packed
+        state = GameStateData()
+        state.food = reconstituteGrid(food)
+        state.capsules = list(capsules)
+        state.layout = layout
+        state.score = score
+        state._win, state._lose = win, lose
+        state.agentStates = []
+        for start, pos, direction, isPacman, scaredTimer, numCarrying, numReturned in agents:
+            agentState = AgentState(Configuration(start, Directions.STOP), isPacman)
+            agentState.configuration = Configuration(pos, direction)
+            agentState.scaredTimer = scaredTimer
+            agentState.numCarrying = numCarrying
+            agentState.numReturned = numReturned
+            state.agentStates.append(agentState)
+        state._eaten = [False] * len(state.agentStates)
+
+        keys = layout.zobristKeys
+        state._hash = 0
+        for x, y in state.food.asList():
+            state._hash ^= keys.foodKey(x, y)
+        for x, y in state.capsules:
+            state._hash ^= keys.capsuleKey(x, y)
+        state._unhashedAgents = (1 << len(state.agentStates)) - 1
+        return state
+    unpack = staticmethod(unpack)
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -504,6 +740,14 @@ class GameStateData:
             self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
         self._eaten = [False for a in self.agentStates]
 
+        keys = layout.zobristKeys
+        self._hash = 0
+        for x, y in self.food.asList():
+            self._hash ^= keys.foodKey(x, y)
+        for x, y in self.capsules:
+            self._hash ^= keys.capsuleKey(x, y)
+        self._unhashedAgents = (1 << len(self.agentStates)) - 1
+
 try:
     import boinc
     _BOINC_ENABLED = True
@@ -515,7 +759,7 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False ):
+    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, fast=False ):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -524,6 +768,7 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.fast = fast
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -568,6 +813,7 @@ class Game:
         """
         Main control loop for game play.
         """
+        if self.fast: return self.runFast()
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -683,7 +929,9 @@ class Game:
                     self.unmute()
                     return
             else:
+                start_time = time.time()
                 action = agent.getAction(observation)
+                self.totalAgentTimes[agentIndex] += time.time() - start_time
             self.unmute()
 
             # Execute the action
@@ -727,3 +975,97 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runFast( self ):
+        """
+        The control loop for headless simulation of many games (pacman.py
+        --fast).  The game plays out exactly as in run(), but:
+
+          - agents with readOnlyObservations get the game state itself
+            instead of a deep copy of it
+          - agent methods are looked up once per game
+          - with muteAgents, all agent output goes to agentOutput[0], muted
+            once for the whole game
+          - the display only sees the start and the end of the game
+          - with catchExceptions, each agent's total time is checked against
+            rules.getMaxTotalTime after every move, and a single alarm for
+            the whole game stops an agent that never returns; there are no
+            per-move timeouts or warnings
+        """
+        self.display.initialize(self.state.data)
+        self.numMoves = 0
+        for i, agent in enumerate(self.agents):
+            if not agent:
+                # this is a null agent, meaning it failed to load
+                print >>sys.stderr, "Agent %d failed to load" % i
+                self._agentCrash(i, quiet=True)
+                return
+
+        if not self.catchExceptions:
+            self._runFastMoves()
+        else:
+            budget = sum([self.rules.getMaxStartupTime(i) + self.rules.getMaxTotalTime(i) for i in range(len(self.agents))])
+            try:
+                TimeoutFunction(self._runFastMoves, int(budget))()
+            except TimeoutFunctionException:
+                print >>sys.stderr, "Agent %d ran out of time!" % self.movingAgent
+                self.agentTimeout = True
+                self._agentCrash(self.movingAgent, quiet=True)
+            except Exception, data:
+                self._agentCrash(self.movingAgent)
+        if not self.agentCrashed:
+            self.display.finish()
+
+    def _runFastMoves( self ):
+        if self.muteAgents:
+            oldStdout, oldStderr = sys.stdout, sys.stderr
+            sys.stdout = sys.stderr = self.agentOutput[0]
+        try:
+            self._playFast()
+        finally:
+            if self.muteAgents:
+                sys.stdout, sys.stderr = oldStdout, oldStderr
+
+    def _playFast( self ):
+        agents = self.agents
+        numAgents = len(agents)
+        readOnly = [agent.readOnlyObservations for agent in agents]
+        observe = [getattr(agent, 'observationFunction', None) for agent in agents]
+        totalTimes = self.totalAgentTimes
+
+        for agentIndex, agent in enumerate(agents):
+            register = getattr(agent, 'registerInitialState', None)
+            if register != None:
+                self.movingAgent = agentIndex
+                register(self.state.deepCopy())
+
+        agentIndex = self.startingIndex
+        while not self.gameOver:
+            self.movingAgent = agentIndex
+            startTime = time.time()
+            if readOnly[agentIndex]:
+                observation = self.state
+            else:
+                observation = self.state.deepCopy()
+            if observe[agentIndex] != None:
+                observation = observe[agentIndex](observation)
+            action = agents[agentIndex].getAction(observation)
+            totalTimes[agentIndex] += time.time() - startTime
+            if self.catchExceptions:
+                if totalTimes[agentIndex] > self.rules.getMaxTotalTime(agentIndex):
+                    print >>sys.stderr, "Agent %d ran out of time! (time: %1.2f)" % (agentIndex, totalTimes[agentIndex])
+                    self.agentTimeout = True
+                    self._agentCrash(agentIndex, quiet=True)
+                    return
+
+            self.moveHistory.append( (agentIndex, action) )
+            self.state = self.state.generateSuccessor( agentIndex, action )
+            self.rules.process(self.state, self)
+            agentIndex = ( agentIndex + 1 ) % numAgents
+
+        # inform a learning agent of the game result
+        for agentIndex, agent in enumerate(agents):
+            final = getattr(agent, 'final', None)
+            if final != None:
+                self.movingAgent = agentIndex
+                final(self.state)
@@ -20,6 +20,8 @@ from util import manhattanDistance
 import util
 
 class GhostAgent( Agent ):
+    readOnlyObservations = True
+
     def __init__( self, index ):
         self.index = index
 
@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -71,14 +72,32 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variables keep track of which states generateSuccessor has been
+    # called on or returned, for graders that count the states an agent
+    # explores.  explored holds fingerprints (see GameStateData.fingerprint)
+    # rather than states, and stays None, so that games pay nothing for it,
+    # until the first call to getAndResetExplored.  If exploredLimit is set,
+    # no more than that many states are counted between resets.
+    explored = None
+    exploredLimit = None
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
+        """
+        Returns the fingerprints of the states explored since the last call
+        and starts counting again.
+        """
+        tmp = GameState.explored
         GameState.explored = set()
+        if tmp is None: return set()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def recordExplored( *states ):
+        explored, limit = GameState.explored, GameState.exploredLimit
+        for state in states:
+            if limit is not None and len(explored) >= limit: return
+            explored.add(state.data.fingerprint())
+    recordExplored = staticmethod(recordExplored)
+
     def getLegalActions( self, agentIndex=0 ):
         """
         Returns the legal actions for the agent specified.
@@ -103,7 +122,7 @@ class GameState:
 
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
+            state.data._eaten = [False] * state.getNumAgents()
             PacmanRules.applyAction( state, action )
         else:                # A ghost is moving
             GhostRules.applyAction( state, action, agentIndex )
@@ -112,7 +131,7 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            GhostRules.decrementTimer( state.data.modifiableAgentState(agentIndex) )
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -120,8 +139,8 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.explored is not None:
+            GameState.recordExplored(self, state)
         return state
 
     def getLegalPacmanActions( self ):
@@ -253,6 +272,19 @@ class GameState:
         """
         self.data.initialize(layout, numGhostAgents)
 
+    def pack( self ):
+        """
+        Returns the state as a small tuple to send to another process, where
+        GameState.unpack rebuilds it on a copy of the layout.
+        """
+        return self.data.pack()
+
+    def unpack( layout, packed ):
+        state = GameState()
+        state.data = GameStateData.unpack(layout, packed)
+        return state
+    unpack = staticmethod(unpack)
+
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
 #                                                                          #
@@ -271,11 +303,11 @@ class ClassicGameRules:
     def __init__(self, timeout=30):
         self.timeout = timeout
 
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False):
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False, fast=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize( layout, len(ghostAgents) )
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions, fast=fast)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -331,7 +363,11 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+        configuration = state.data.agentStates[0].configuration
+        layout = state.data.layout
+        cell = layout.cellIds.get( configuration.pos )
+        if cell is not None: return layout.possibleActions[cell][:]
+        return Actions.getPossibleActions( configuration, layout.walls )
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action ):
@@ -342,7 +378,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.modifiableAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -363,6 +399,7 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data._hash ^= state.data.layout.zobristKeys.foodKey(x, y)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -371,11 +408,13 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
+            state.data.capsules = state.data.capsules[:]
             state.data.capsules.remove( position )
+            state.data._hash ^= state.data.layout.zobristKeys.capsuleKey(x, y)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.modifiableAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -388,8 +427,11 @@ class GhostRules:
         Ghosts cannot stop, and cannot turn around unless they
         reach a dead end, but can turn 90 degrees at intersections.
         """
-        conf = state.getGhostState( ghostIndex ).configuration
-        possibleActions = Actions.getPossibleActions( conf, state.data.layout.walls )
+        conf = state.data.agentStates[ghostIndex].configuration
+        layout = state.data.layout
+        cell = layout.cellIds.get( conf.pos )
+        if cell is not None: return layout.ghostActions[cell][conf.direction][:]
+        possibleActions = Actions.getPossibleActions( conf, layout.walls )
         reverse = Actions.reverseDirection( conf.direction )
         if Directions.STOP in possibleActions:
             possibleActions.remove( Directions.STOP )
@@ -404,7 +446,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.modifiableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
@@ -414,7 +456,8 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            configuration = ghostState.configuration
+            ghostState.configuration = Configuration( nearestPoint( configuration.pos ), configuration.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -435,10 +478,12 @@ class GhostRules:
 
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.modifiableAgentState(agentIndex)
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -523,6 +568,12 @@ def readCommand( argv ):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--fast', action='store_true', dest='fast',
+                      help='Headless high-throughput simulation: no graphics, no per-move copies for read-only agents and one time budget per game (see Game.runFast)', default=False)
+    parser.add_option('-j', '--jobs', dest='jobs', type='int',
+                      help='Play the games in this many worker processes, each game with its own seed derived from the random seed (see runGamesParallel)', default=0)
+    parser.add_option('--metrics', dest='metricsFile',
+                      help='Write the metrics agents report (e.g. SearchAgent search statistics) to this JSON file, or CSV if it ends in .csv', default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -537,7 +588,7 @@ def readCommand( argv ):
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
 
     # Choose a Pacman agent
-    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics)
+    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics or options.fast or options.jobs)
     pacmanType = loadAgent(options.pacman, noKeyboard)
     agentOpts = parseAgentArgs(options.agentArgs)
     if options.numTraining > 0:
@@ -556,7 +607,7 @@ def readCommand( argv ):
     args['ghosts'] = [ghostType( i+1 ) for i in range( options.numGhosts )]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.quietGraphics or options.fast or options.jobs:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -570,6 +621,12 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['metricsFile'] = options.metricsFile
+    args['fast'] = options.fast
+    if options.jobs:
+        if options.jobs < 0: raise Exception('The number of jobs must be positive')
+        if options.numTraining > 0: raise Exception('Training games cannot be played in parallel')
+        args['jobs'] = options.jobs
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -625,12 +682,186 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+def gameMetrics( game, index, layout ):
+    """
+    Returns one metrics record for every agent in a finished game that has a
+    metrics dictionary (SearchAgent fills one in with its search statistics).
+    """
+    records = []
+    for agentIndex, agent in enumerate(game.agents):
+        metrics = getattr(agent, 'metrics', None)
+        if metrics is None: continue
+        record = {'game': index, 'layout': layout.name, 'agentIndex': agentIndex,
+                  'agent': agent.__class__.__name__, 'score': game.state.getScore(),
+                  'win': game.state.isWin()}
+        record.update(metrics)
+        records.append(record)
+    return records
+
+def writeMetrics( records, filename ):
+    "Writes metrics records as a JSON list, or as CSV if filename ends in .csv"
+    f = open(filename, 'w')
+    try:
+        if filename.endswith('.csv'):
+            import csv
+            fields = []
+            for record in records:
+                fields += [key for key in sorted(record) if key not in fields]
+            writer = csv.DictWriter(f, fields)
+            writer.writerow(dict(zip(fields, fields)))
+            writer.writerows(records)
+        else:
+            import json
+            json.dump(records, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+def printSummary( scores, wins ):
+    "Prints the summary shown at the end of runGames"
+    winRate = wins.count(True)/ float(len(wins))
+    print 'Average Score:', sum(scores) / float(len(scores))
+    print 'Scores:       ', ', '.join([str(score) for score in scores])
+    print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate)
+    print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
+
+def recordGame( layout, actions, index ):
+    "Pickles a game history so that it can be replayed with --replay"
+    import time, cPickle
+    fname = ('recorded-game-%d' % (index + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = file(fname, 'w')
+    components = {'layout': layout, 'actions': actions}
+    cPickle.dump(components, f)
+    f.close()
+
+def gameSeed( seed, index ):
+    """
+    The seed of game number index in a parallel run seeded with seed.  It
+    depends only on these two, so a game plays the same whichever worker
+    plays it and however many workers there are.
+    """
+    return '%s-%d' % (seed, index)
+
+class GameResult:
+    """
+    What runGames reports about one finished game: the attributes of the
+    Game that played it that describe the outcome (state, the final
+    GameState; moveHistory; totalAgentTimes; agentCrashed and agentTimeout),
+    the game's number and seed, and the metrics records of its agents.
+
+    Games played in other processes come back as GameResults too, so the
+    final state is pickled packed (see GameState.pack) and restore puts it
+    back together on the layout of the run.
+    """
+    def __init__( self, game, index, layout, seed=None ):
+        self.index = index
+        self.seed = seed
+        self.state = game.state
+        self.moveHistory = game.moveHistory
+        self.totalAgentTimes = game.totalAgentTimes
+        self.agentCrashed = game.agentCrashed
+        self.agentTimeout = game.agentTimeout
+        self.metrics = gameMetrics(game, index, layout)
+
+    def __getstate__( self ):
+        fields = self.__dict__.copy()
+        fields['state'] = self.state.pack()
+        return fields
+
+    def restore( self, layout ):
+        "Unpacks the final state, if it was pickled, on layout"
+        if isinstance(self.state, tuple): self.state = GameState.unpack(layout, self.state)
+
+# The game setup runGamesParallel hands its workers, through initParallelWorker
+_parallelSetup = None
+
+def initParallelWorker( setup ):
+    "Stores the setup of a parallel run in the process that plays its games"
+    global _parallelSetup
+    _parallelSetup = setup
+
+def playSeededGame( index ):
+    """
+    Plays game number index of a parallel run (see runGamesParallel) and
+    returns its GameResult.
+    """
+    layout, pacman, ghosts, display, rules, catchExceptions, fast, seed = _parallelSetup
+    random.seed(gameSeed(seed, index))
+    game = rules.newGame( layout, pacman, ghosts, display, True, catchExceptions, fast )
+    game.run()
+    return GameResult(game, index, layout, gameSeed(seed, index))
+
+def runGamesParallel( layout, pacman, ghosts, display, numGames, record, jobs, catchExceptions=False, timeout=30, metricsFile=None, fast=False, seed=None ):
+    """
+    Plays numGames games in jobs worker processes.  Game i is seeded with
+    gameSeed(seed, i), so the results are the same for any number of jobs
+    (including 1, which plays in this process) as long as the agents do not
+    carry anything over from one game to the next.  Seed defaults to a number
+    drawn from the random module, which -f fixes.
+
+    Results stream back in game order and are printed as they arrive; the
+    return value is the list of their GameResults, as for runGames.
+    """
     import __main__
     __main__.__dict__['_display'] = display
+    if seed == None: seed = random.randrange(2 ** 31)
 
     rules = ClassicGameRules(timeout)
-    games = []
+    setup = (layout, pacman, ghosts, display, rules, catchExceptions, fast, seed)
+    pool = None
+    if jobs > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs, initParallelWorker, (setup,))
+        played = pool.imap(playSeededGame, range(numGames))
+    else:
+        initParallelWorker(setup)
+        played = (playSeededGame(i) for i in range(numGames))
+
+    results = []
+    metrics = []
+    try:
+        for result in played:
+            result.restore(layout)
+            state = result.state
+            if result.agentCrashed: pass # the worker reported the crash
+            elif state.isWin(): print "Pacman emerges victorious! Score: %d" % state.getScore()
+            else: print "Pacman died! Score: %d" % state.getScore()
+            if record: recordGame(layout, result.moveHistory, result.index)
+            metrics += result.metrics
+            results.append(result)
+    finally:
+        if pool != None:
+            pool.terminate()
+            pool.join()
+
+    if numGames > 0:
+        printSummary([result.state.getScore() for result in results], [result.state.isWin() for result in results])
+        moves = [len(result.moveHistory) for result in results]
+        print 'Moves:         %.1f average' % (sum(moves) / float(len(moves)))
+        for agentIndex in range(len(results[0].totalAgentTimes)):
+            agentTime = sum([result.totalAgentTimes[agentIndex] for result in results])
+            print 'Agent %d time:  %.2fs total, %.4fs per game' % (agentIndex, agentTime, agentTime / len(results))
+
+    if metricsFile != None:
+        writeMetrics(metrics, metricsFile)
+
+    return results
+
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, metricsFile=None, fast=False, jobs=0 ):
+    """
+    Plays numGames games, the first numTraining of them quietly, and returns
+    a GameResult for each of the others.  With jobs the games are played by
+    runGamesParallel.
+    """
+    if metricsFile != None:
+        for agent in [pacman] + ghosts: agent.collectMetrics = True
+    if jobs:
+        return runGamesParallel(layout, pacman, ghosts, display, numGames, record, jobs, catchExceptions, timeout, metricsFile, fast)
+    import __main__
+    __main__.__dict__['_display'] = display
+
+    rules = ClassicGameRules(timeout)
+    results = []
+    metrics = []
 
     for i in range( numGames ):
         beQuiet = i < numTraining
@@ -642,28 +873,25 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         else:
             gameDisplay = display
             rules.quiet = False
-        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
+        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions, fast)
         game.run()
-        if not beQuiet: games.append(game)
+        if not beQuiet:
+            result = GameResult(game, i - numTraining, layout)
+            results.append(result)
+            metrics += result.metrics
 
         if record:
-            import time, cPickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            cPickle.dump(components, f)
-            f.close()
+            recordGame(layout, game.moveHistory, i)
 
     if (numGames-numTraining) > 0:
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True)/ float(len(wins))
-        print 'Average Score:', sum(scores) / float(len(scores))
-        print 'Scores:       ', ', '.join([str(score) for score in scores])
-        print 'Win Rate:      %d/%d (%.2f)' % (wins.count(True), len(wins), winRate)
-        print 'Record:       ', ', '.join([ ['Loss', 'Win'][int(w)] for w in wins])
-
-    return games
+        scores = [result.state.getScore() for result in results]
+        wins = [result.state.isWin() for result in results]
+        printSummary(scores, wins)
+
+    if metricsFile != None:
+        writeMetrics(metrics, metricsFile)
+
+    return results
 
 if __name__ == '__main__':
     """
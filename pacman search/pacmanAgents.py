@@ -20,6 +20,7 @@ import util
 
 class LeftTurnAgent(game.Agent):
     "An agent that turns left at every opportunity"
+    readOnlyObservations = True
 
     def getAction(self, state):
         legal = state.getLegalPacmanActions()
@@ -33,6 +34,8 @@ class LeftTurnAgent(game.Agent):
         return Directions.STOP
 
 class GreedyAgent(Agent):
+    readOnlyObservations = True
+
     def __init__(self, evalFn="scoreEvaluation"):
         self.evaluationFunction = util.lookup(evalFn, globals())
         assert self.evaluationFunction != None
@@ -18,6 +18,7 @@ Pacman agents (in searchAgents.py).
 """
 
 import util
+import time
 
 class SearchProblem:
     """
@@ -73,6 +74,194 @@ def tinyMazeSearch(problem):
     return  [s, s, w, s, w, w, s, w]
 
 
+class SearchMetrics:
+    """
+    Statistics about one run of a search function, for comparing heuristics
+    and data structures across layouts.  While collectMetrics is set, every
+    search function in this file fills one in and leaves it in
+    search.lastMetrics.
+
+      nodesGenerated:  successors returned by getSuccessors
+      nodesExpanded:   calls to getSuccessors
+      duplicatePushes: pushes of a state that had been pushed before
+      peakFrontier:    most entries on the frontier(s) at once
+      peakClosed:      most states in the closed set(s) at once
+      heuristicCalls:  calls to the heuristic
+      heuristicTime:   seconds spent in the heuristic
+      successorTime:   seconds spent in getSuccessors
+      searchTime:      seconds spent in the whole search
+    """
+    enabled = True
+
+    def __init__(self, algorithm):
+        self.algorithm = algorithm
+        self.nodesGenerated = 0
+        self.nodesExpanded = 0
+        self.duplicatePushes = 0
+        self.peakFrontier = 0
+        self.peakClosed = 0
+        self.heuristicCalls = 0
+        self.heuristicTime = 0.0
+        self.successorTime = 0.0
+        self.searchTime = 0.0
+        self.startTime = time.time()
+
+    def successors(self, getSuccessors, state):
+        "Calls getSuccessors(state), counting and timing it."
+        start = time.time()
+        successors = getSuccessors(state)
+        self.successorTime += time.time() - start
+        self.nodesExpanded += 1
+        self.nodesGenerated += len(successors)
+        return successors
+
+    def heuristic(self, heuristic, state, problem):
+        "Calls heuristic(state, problem), counting and timing it."
+        start = time.time()
+        value = heuristic(state, problem)
+        self.heuristicTime += time.time() - start
+        self.heuristicCalls += 1
+        return value
+
+    def sizes(self, frontier, closed):
+        "Records the current frontier and closed set sizes."
+        if frontier > self.peakFrontier: self.peakFrontier = frontier
+        if closed > self.peakClosed: self.peakClosed = closed
+
+    def finish(self):
+        self.searchTime = time.time() - self.startTime
+        global lastMetrics
+        lastMetrics = self
+
+    def asDict(self):
+        return {'algorithm': self.algorithm,
+                'nodesGenerated': self.nodesGenerated,
+                'nodesExpanded': self.nodesExpanded,
+                'duplicatePushes': self.duplicatePushes,
+                'peakFrontier': self.peakFrontier,
+                'peakClosed': self.peakClosed,
+                'heuristicCalls': self.heuristicCalls,
+                'heuristicTime': self.heuristicTime,
+                'successorTime': self.successorTime,
+                'searchTime': self.searchTime}
+
+class NullMetrics:
+    """
+    Stands in for SearchMetrics when no one asked for metrics: it calls the
+    successor function and heuristic straight through, without timing them,
+    and leaves search.lastMetrics None.
+    """
+    enabled = False
+    nodesGenerated = nodesExpanded = duplicatePushes = 0
+
+    def successors(self, getSuccessors, state):
+        return getSuccessors(state)
+
+    def heuristic(self, heuristic, state, problem):
+        return heuristic(state, problem)
+
+    def sizes(self, frontier, closed):
+        pass
+
+    def finish(self):
+        global lastMetrics
+        lastMetrics = None
+
+# Whether searches record SearchMetrics (set by SearchAgent for pacman.py
+# --metrics, and by benchmark.py), and the SearchMetrics of the most recent
+# search that did
+collectMetrics = False
+lastMetrics = None
+
+def newMetrics(algorithm):
+    "A SearchMetrics for a run of algorithm if collectMetrics is set, else a NullMetrics"
+    if collectMetrics: return SearchMetrics(algorithm)
+    return NullMetrics()
+
+def graphSearch(problem, frontier, heuristic=None, algorithm='graphSearch'):
+    """
+    The search core shared by every algorithm below.
+
+    The frontier only ever holds integer node ids.  Each node is stored once
+    in a node table (parallel lists of state, parent id, action and path cost)
+    so a frontier entry costs O(1) memory no matter how deep it is, and the
+    list of actions is only rebuilt by following parent pointers once a goal
+    has been reached.  Expanded states are kept in a hashed closed set, so
+    search states must be hashable.
+
+      frontier:  a Stack, Queue or PriorityQueue from util.py
+      heuristic: None for uninformed search.  If frontier is a PriorityQueue,
+                 nodes are ordered by path cost plus heuristic(state, problem)
+      algorithm: the name recorded in the SearchMetrics of the run
+    """
+    metrics = newMetrics(algorithm)
+    prioritized = isinstance(frontier, util.PriorityQueue)
+    #node table: node id -> state, parent id, action taken from parent, path cost
+    states, parents, actions, costs = [], [], [], []
+    #every state ever pushed, to count duplicate pushes
+    pushed = None
+    if metrics.enabled: pushed = set()
+
+    def addNode(state, parent, action, cost):
+        node = len(states)
+        states.append(state)
+        parents.append(parent)
+        actions.append(action)
+        costs.append(cost)
+        if not prioritized:
+            frontier.push(node)
+        elif heuristic is None:
+            frontier.push(node, cost)
+        else:
+            frontier.push(node, cost + metrics.heuristic(heuristic, state, problem))
+        if pushed is not None:
+            if state in pushed:
+                metrics.duplicatePushes += 1
+            else:
+                pushed.add(state)
+
+    #full cycle checker
+    closed = set()
+    addNode(problem.getStartState(), None, None, 0)
+    frontierSize = 1
+
+    while not frontier.isEmpty():
+        metrics.sizes(frontierSize, len(closed))
+        #pop a node
+        node = frontier.pop()
+        frontierSize -= 1
+        state = states[node]
+        if state in closed:
+            continue
+        #mark as visited
+        closed.add(state)
+        #check if node is goal
+        if problem.isGoalState(state):
+            metrics.finish()
+            return reconstructPath(node, parents, actions)
+        #push unvisited successors into frontier
+        cost = costs[node]
+        for successor, action, stepCost in metrics.successors(problem.getSuccessors, state):
+            if successor not in closed:
+                addNode(successor, node, action, cost + stepCost)
+                frontierSize += 1
+
+    #no path found, return empty path
+    metrics.finish()
+    return []
+
+def reconstructPath(node, parents, actions):
+    """
+    Follows parent pointers from node back to the root of a node table and
+    returns the actions taken along the way, in order.
+    """
+    path = []
+    while parents[node] is not None:
+        path.append(actions[node])
+        node = parents[node]
+    path.reverse()
+    return path
+
 def depthFirstSearch(problem):
     """
     Search the deepest nodes in the search tree first.
@@ -87,88 +276,15 @@ def depthFirstSearch(problem):
     print "Is the start a goal?", problem.isGoalState(problem.getStartState())
     print "Start's successors:", problem.getSuccessors(problem.getStartState())
     """
-
-    #stack for frontier in format: [node, path taken, ancestor nodes]
-    stack = util.Stack()
-    start = problem.getStartState()
-    stack.push((start, [], []))
-
-    while not stack.isEmpty():
-        #pop a node and a path to it
-        node, path, path_checker = stack.pop()
-        #get successors
-        if problem.isGoalState(node):
-            return path
-        successors = problem.getSuccessors(node)
-        for i in range(len(successors)):
-            #node has not been visited by ancestors
-            if successors[i][0] not in path_checker:
-                #push into frontier
-                stack.push((successors[i][0], path + [successors[i][1]], path_checker + [successors[i][0]]))
-
-    #no path found, return empty path
-    return []
+    return graphSearch(problem, util.Stack(), algorithm='depthFirstSearch')
 
 def breadthFirstSearch(problem):
     """Search the shallowest nodes in the search tree first."""
-    #queue for frontier in format: [node, path taken]
-    queue = util.Queue()
-    #full cycle checker
-    visited = []
-
-    start = problem.getStartState()
-
-    queue.push((start, []))
-
-    while not queue.isEmpty():
-        #pop a node and a path to it
-        node, path = queue.pop()
-        if node not in visited:
-            #mark as visited
-            visited.append(node)
-           #check if goal state
-            if problem.isGoalState(node):
-                return path
-             #get successors
-            successors = problem.getSuccessors(node)
-            for i in range(len(successors)):
-                #node has not been visited
-                if successors[i][0] not in visited:
-                    #push into frontier
-                    queue.push((successors[i][0], path + [successors[i][1]]))
-
-    #no path found, return empty path
-    return []
-    util.raiseNotDefined()
+    return graphSearch(problem, util.Queue(), algorithm='breadthFirstSearch')
 
 def uniformCostSearch(problem):
     """Search the node of least total cost first."""
-    #priority queue for frontier in format: [(current node, path, cost), cost]
-    frontier = util.PriorityQueue()
-    #full cycle checker
-    visited = []
-    start = problem.getStartState()
-    frontier.push((start, [], 0), 0)
-
-    while not frontier.isEmpty():
-        #pop a node and a path to it
-        node, path, cost = frontier.pop()
-        if node not in visited:
-            #mark as visited
-            visited.append(node)
-            #check if node is goal
-            if problem.isGoalState(node):
-                return path
-            #get successors
-            successors = problem.getSuccessors(node)
-            for i in range(len(successors)):
-                #node has not been visited
-                if successors[i][0] not in visited:
-                    #push into frontier
-                    frontier.push((successors[i][0], path + [successors[i][1]], successors[i][2] + cost), successors[i][2] + cost)
-
-    #no path found, return empty path
-    return []
+    return graphSearch(problem, util.PriorityQueue(), algorithm='uniformCostSearch')
 
 def nullHeuristic(state, problem=None):
     """
@@ -179,36 +295,194 @@ def nullHeuristic(state, problem=None):
 
 def aStarSearch(problem, heuristic=nullHeuristic):
     """Search the node that has the lowest combined cost and heuristic first."""
-    #priority queue for frontier in format: [(current node, path, cost), cost]
-    frontier = util.PriorityQueue()
-    #full cycle checker
-    visited = []
-    start = problem.getStartState()
-    frontier.push((start, [], 0), 0)
+    return graphSearch(problem, util.PriorityQueue(), heuristic, 'aStarSearch')
 
-    while not frontier.isEmpty():
-        #pop a node and a path to it
-        node, path, cost = frontier.pop()
-        if node not in visited:
-            #mark as visited
-            visited.append(node)
-            #check if node is goal
-            if problem.isGoalState(node):
-                return path
-            #get successors
-            successors = problem.getSuccessors(node)
-            for i in range(len(successors)):
-                #node has not been visited
-                if successors[i][0] not in visited:
-                    #push into frontier
-                    f = successors[i][2] + cost + heuristic(successors[i][0], problem)
-                    frontier.push((successors[i][0], path + [successors[i][1]], successors[i][2] + cost), f)
+class ReversedProblem:
+    """
+    Presents a single goal SearchProblem with its start and goal swapped.
+
+    Bidirectional search hands this to the heuristic on the backward side, so
+    heuristics written against problem.goal (like manhattanHeuristic) estimate
+    the distance back to the start.  Everything else is read from problem.
+    """
+    def __init__(self, problem):
+        self.problem = problem
+        self.goal = problem.getStartState()
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+    def getStartState(self):
+        return self.problem.goal
+
+    def isGoalState(self, state):
+        return state == self.goal
+
+def backwardSuccessors(problem, state):
+    """
+    Returns the states that lead to state in one move, as triples of
+    (predecessor, action from predecessor to state, stepCost).
+
+    Moves must be reversible.  When the problem charges for entering a state
+    through a costFn (like PositionSearchProblem) that cost is used, otherwise
+    a move is assumed to cost the same in both directions.
+    """
+    from game import Actions
+    costFn = getattr(problem, 'costFn', None)
+    predecessors = []
+    for predecessor, action, stepCost in problem.getSuccessors(state):
+        if costFn is not None:
+            stepCost = costFn(state)
+        predecessors.append((predecessor, Actions.reverseDirection(action), stepCost))
+    return predecessors
+
+def joinPaths(meet, forwardParents, backwardParents):
+    """
+    Returns the actions from the start to meet (following forwardParents) and
+    then from meet to the goal (following backwardParents).  Each parent map
+    takes a state to (neighbor, action), where the action leads from the
+    neighbor to the state going forward and from the state to the neighbor
+    going backward.
+    """
+    path = []
+    state = meet
+    while forwardParents[state] is not None:
+        state, action = forwardParents[state]
+        path.append(action)
+    path.reverse()
+    state = meet
+    while backwardParents[state] is not None:
+        state, action = backwardParents[state]
+        path.append(action)
+    return path
+
+def checkSingleGoal(problem):
+    if getattr(problem, 'goal', None) is None:
+        raise Exception, 'Bidirectional search needs a problem with a single goal (problem.goal)'
+
+def bidirectionalBreadthFirstSearch(problem):
+    """
+    Search the shallowest nodes from both the start and the goal at once,
+    for problems with one explicit goal (problem.goal) and reversible moves.
+
+    Each round expands one whole level of whichever side has the smaller
+    frontier.  Once a round generates a state the other side has already
+    reached, the shortest path through any of those meeting states is a
+    shortest path overall, so the two balls searched have about half the
+    radius of a one-sided search.
+    """
+    checkSingleGoal(problem)
+    metrics = newMetrics('bidirectionalBreadthFirstSearch')
+    start, goal = problem.getStartState(), problem.goal
+    if start == goal:
+        metrics.finish()
+        return []
+    #per side: depth of every state reached and a parent map for the path
+    depths = ({start: 0}, {goal: 0})
+    parents = ({start: None}, {goal: None})
+    frontiers = ([start], [goal])
+
+    while frontiers[0] and frontiers[1]:
+        metrics.sizes(len(frontiers[0]) + len(frontiers[1]), len(depths[0]) + len(depths[1]))
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        reached, otherReached = depths[side], depths[1 - side]
+        best, meet = None, None
+        nextFrontier = []
+        for state in frontiers[side]:
+            if side == 0:
+                neighbors = metrics.successors(problem.getSuccessors, state)
+            else:
+                neighbors = metrics.successors(lambda state: backwardSuccessors(problem, state), state)
+            for neighbor, action, stepCost in neighbors:
+                if neighbor in reached:
+                    continue
+                reached[neighbor] = reached[state] + 1
+                parents[side][neighbor] = (state, action)
+                nextFrontier.append(neighbor)
+                if neighbor in otherReached:
+                    length = reached[neighbor] + otherReached[neighbor]
+                    if best is None or length < best:
+                        best, meet = length, neighbor
+        frontiers = (nextFrontier, frontiers[1]) if side == 0 else (frontiers[0], nextFrontier)
+        if meet is not None:
+            #lets the problem draw its expanded cells
+            problem.isGoalState(goal)
+            metrics.finish()
+            return joinPaths(meet, parents[0], parents[1])
 
     #no path found, return empty path
+    metrics.finish()
     return []
 
+def bidirectionalAStarSearch(problem, heuristic=nullHeuristic):
+    """
+    Search from the start towards the goal and from the goal towards the
+    start at once, each side ordered by path cost plus heuristic, for problems
+    with one explicit goal (problem.goal) and reversible moves.
+
+    The backward side calls heuristic(state, ReversedProblem(problem)), so a
+    heuristic against problem.goal estimates the cost back to the start.
+    mu is the cheapest path found through any state reached by both sides.
+    With a consistent heuristic, every cheaper path would have to pass through
+    an open state of either frontier with f below mu, so the search stops as
+    soon as the smallest f on either frontier reaches mu.
+    """
+    checkSingleGoal(problem)
+    metrics = newMetrics('bidirectionalAStarSearch')
+    start, goal = problem.getStartState(), problem.goal
+    reverse = ReversedProblem(problem)
+    problems = (problem, reverse)
+    costs = ({start: 0}, {goal: 0})
+    parents = ({start: None}, {goal: None})
+    closed = (set(), set())
+    frontiers = (util.PriorityQueue(), util.PriorityQueue())
+    frontiers[0].push(start, metrics.heuristic(heuristic, start, problem))
+    frontiers[1].push(goal, metrics.heuristic(heuristic, goal, reverse))
+    mu, meet = (0, start) if start == goal else (float('inf'), None)
+
+    while not frontiers[0].isEmpty() and not frontiers[1].isEmpty():
+        metrics.sizes(len(frontiers[0].heap) + len(frontiers[1].heap), len(closed[0]) + len(closed[1]))
+        lowestForward, lowestBackward = frontiers[0].heap[0][0], frontiers[1].heap[0][0]
+        if max(lowestForward, lowestBackward) >= mu:
+            break
+        #without a heuristic this is bidirectional uniform cost search, which
+        #can stop once the two smallest path costs add up to mu
+        if heuristic is nullHeuristic and lowestForward + lowestBackward >= mu:
+            break
+        side = 0 if len(frontiers[0].heap) <= len(frontiers[1].heap) else 1
+        state = frontiers[side].pop()
+        if state in closed[side]:
+            continue
+        closed[side].add(state)
+        cost = costs[side][state]
+        if side == 0:
+            neighbors = metrics.successors(problem.getSuccessors, state)
+        else:
+            neighbors = metrics.successors(lambda state: backwardSuccessors(problem, state), state)
+        for neighbor, action, stepCost in neighbors:
+            neighborCost = cost + stepCost
+            if neighbor in closed[side] or neighborCost >= costs[side].get(neighbor, float('inf')):
+                continue
+            if neighbor in costs[side]:
+                metrics.duplicatePushes += 1
+            costs[side][neighbor] = neighborCost
+            parents[side][neighbor] = (state, action)
+            frontiers[side].push(neighbor, neighborCost + metrics.heuristic(heuristic, neighbor, problems[side]))
+            if neighbor in costs[1 - side] and neighborCost + costs[1 - side][neighbor] < mu:
+                mu, meet = neighborCost + costs[1 - side][neighbor], neighbor
+
+    metrics.finish()
+    if meet is None:
+        #no path found, return empty path
+        return []
+    #lets the problem draw its expanded cells
+    problem.isGoalState(goal)
+    return joinPaths(meet, parents[0], parents[1])
+
 # Abbreviations
 bfs = breadthFirstSearch
 dfs = depthFirstSearch
 astar = aStarSearch
 ucs = uniformCostSearch
+bibfs = bidirectionalBreadthFirstSearch
+biastar = bidirectionalAStarSearch
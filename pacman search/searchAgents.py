@@ -37,9 +37,14 @@ Good luck and happy searching!
 from game import Directions
 from game import Agent
 from game import Actions
+from game import Grid
 import util
 import time
 import search
+import sys
+import array
+import bisect
+import collections
 
 class GoWestAgent(Agent):
     "An agent that goes West until it can't."
@@ -69,18 +74,27 @@ class SearchAgent(Agent):
     Options for fn include:
       depthFirstSearch or dfs
       breadthFirstSearch or bfs
+      bidirectionalBreadthFirstSearch or bibfs (PositionSearchProblem only)
+      bidirectionalAStarSearch or biastar (PositionSearchProblem only)
+      jumpPointSearch (PositionSearchProblem only)
+      contractedSearch
+      heldKarpSearch (FoodSearchProblem only)
 
 
     Note: You should NOT change any code in SearchAgent
     """
+    readOnlyObservations = True
 
     def __init__(self, fn='depthFirstSearch', prob='PositionSearchProblem', heuristic='nullHeuristic'):
         # Warning: some advanced Python magic is employed below to find the right functions and problems
 
         # Get the search function from the name and heuristic
-        if fn not in dir(search):
-            raise AttributeError, fn + ' is not a search function in search.py.'
-        func = getattr(search, fn)
+        if fn in globals().keys() and fn.endswith('Search'):
+            func = globals()[fn]
+        elif fn in dir(search):
+            func = getattr(search, fn)
+        else:
+            raise AttributeError, fn + ' is not a search function in search.py or searchAgents.py.'
         if 'heuristic' not in func.func_code.co_varnames:
             print('[SearchAgent] using function ' + fn)
             self.searchFunction = func
@@ -112,12 +126,21 @@ class SearchAgent(Agent):
         """
         if self.searchFunction == None: raise Exception, "No search function provided for SearchAgent"
         starttime = time.time()
+        search.lastMetrics = None
+        search.collectMetrics = self.collectMetrics
+        self.actionIndex = 0
         problem = self.searchType(state) # Makes a new search problem
         self.actions  = self.searchFunction(problem) # Find a path
         totalCost = problem.getCostOfActions(self.actions)
         print('Path found with total cost of %d in %.1f seconds' % (totalCost, time.time() - starttime))
         if '_expanded' in dir(problem): print('Search nodes expanded: %d' % problem._expanded)
 
+        # Metrics of the search, picked up by pacman.py --metrics
+        self.metrics = {'pathCost': totalCost, 'pathLength': len(self.actions),
+                        'totalTime': time.time() - starttime}
+        if '_expanded' in dir(problem): self.metrics['problemExpanded'] = problem._expanded
+        if search.lastMetrics is not None: self.metrics.update(search.lastMetrics.asDict())
+
     def getAction(self, state):
         """
         Returns the next action in the path chosen earlier (in
@@ -227,6 +250,130 @@ class PositionSearchProblem(search.SearchProblem):
             cost += self.costFn((x,y))
         return cost
 
+def jumpPointSearch(problem, heuristic=search.nullHeuristic):
+    """
+    Jump Point Search for a PositionSearchProblem (or AnyFoodSearchProblem)
+    whose steps all cost the same.
+
+    Instead of pushing every neighbor, a move keeps jumping in a straight line
+    over cells that any other equally short path could also reach, and only
+    stops at jump points: goals, cells with a forced neighbor around a wall
+    corner, and (for horizontal moves) cells from which a vertical jump finds
+    a jump point.  A* then runs over jump points only, ordered by path cost
+    plus heuristic(position, problem), and the straight segments between them
+    are turned back into actions.  Every jump point popped counts as one node
+    in problem._expanded.
+
+    If costFn charges different amounts for different cells (for example
+    StayEastSearchAgent), symmetric paths no longer cost the same, so this
+    falls back to ordinary A* on the problem.
+    """
+    walls = problem.walls
+    stepCosts = set([problem.costFn(cell) for cell in walls.asList(False)])
+    if len(stepCosts) > 1:
+        return search.aStarSearch(problem, heuristic)
+    stepCost = stepCosts.pop() if stepCosts else 1
+
+    width, height = walls.width, walls.height
+    def isOpen(x, y):
+        return 0 <= x < width and 0 <= y < height and not walls[x][y]
+
+    def jumpVertical(x, y, dy):
+        while True:
+            y += dy
+            if not isOpen(x, y): return None
+            if problem.isGoalState((x, y)): return (x, y)
+            #a side cell that can't be reached from the cell behind it first
+            if (isOpen(x + 1, y) and not isOpen(x + 1, y - dy)) or \
+               (isOpen(x - 1, y) and not isOpen(x - 1, y - dy)):
+                return (x, y)
+
+    def jumpHorizontal(x, y, dx):
+        while True:
+            x += dx
+            if not isOpen(x, y): return None
+            if problem.isGoalState((x, y)): return (x, y)
+            if (isOpen(x, y + 1) and not isOpen(x - dx, y + 1)) or \
+               (isOpen(x, y - 1) and not isOpen(x - dx, y - 1)):
+                return (x, y)
+            if jumpVertical(x, y, 1) is not None or jumpVertical(x, y, -1) is not None:
+                return (x, y)
+
+    def directions(position, parent):
+        "Returns the (dx, dy) moves worth jumping along from position."
+        if parent is None:
+            return [(0, 1), (0, -1), (1, 0), (-1, 0)]
+        x, y = position
+        px, py = parent
+        if py == y:
+            dx = 1 if x > px else -1
+            return [(0, 1), (0, -1), (dx, 0)]
+        dy = 1 if y > py else -1
+        moves = [(0, dy)]
+        for dx in (1, -1):
+            if isOpen(x + dx, y) and not isOpen(x + dx, y - dy):
+                moves.append((dx, 0))
+        return moves
+
+    metrics = search.newMetrics('jumpPointSearch')
+    start = problem.getStartState()
+    costs = {start: 0}
+    parents = {start: None}
+    closed = set()
+    frontier = util.PriorityQueue()
+    frontier.push(start, metrics.heuristic(heuristic, start, problem))
+
+    while not frontier.isEmpty():
+        metrics.sizes(len(frontier.heap), len(closed))
+        position = frontier.pop()
+        if position in closed:
+            continue
+        closed.add(position)
+        if problem.isGoalState(position):
+            metrics.finish()
+            return jumpPointPath(position, parents)
+
+        # Bookkeeping for display purposes
+        problem._expanded += 1
+        metrics.nodesExpanded += 1
+        if position not in problem._visited:
+            problem._visited[position] = True
+            problem._visitedlist.append(position)
+
+        x, y = position
+        for dx, dy in directions(position, parents[position]):
+            if dx == 0:
+                jumpPoint = jumpVertical(x, y, dy)
+            else:
+                jumpPoint = jumpHorizontal(x, y, dx)
+            if jumpPoint is None or jumpPoint in closed:
+                continue
+            cost = costs[position] + stepCost * util.manhattanDistance(position, jumpPoint)
+            metrics.nodesGenerated += 1
+            if cost < costs.get(jumpPoint, float('inf')):
+                if jumpPoint in costs:
+                    metrics.duplicatePushes += 1
+                costs[jumpPoint] = cost
+                parents[jumpPoint] = position
+                frontier.push(jumpPoint, cost + metrics.heuristic(heuristic, jumpPoint, problem))
+
+    #no path found, return empty path
+    metrics.finish()
+    return []
+
+def jumpPointPath(position, parents):
+    "Expands the straight segments between jump points back into actions."
+    path = []
+    while parents[position] is not None:
+        parent = parents[position]
+        dx = position[0] - parent[0]
+        dy = position[1] - parent[1]
+        action = Actions.vectorToDirection((dx, dy))
+        path += [action] * (abs(dx) + abs(dy))
+        position = parent
+    path.reverse()
+    return path
+
 class StayEastSearchAgent(SearchAgent):
     """
     An agent for position search with a cost function that penalizes being in
@@ -307,7 +454,7 @@ class CornersProblem(search.SearchProblem):
         Returns the start state (in your state space, not the full Pacman state
         space)
         """
-        return (self.startingPosition, [])
+        return (self.startingPosition, ())
         util.raiseNotDefined()
 
     def isGoalState(self, state):
@@ -340,9 +487,7 @@ class CornersProblem(search.SearchProblem):
                 nextState = (nextx, nexty)
                 cost = 1
                 if nextState in self.corners and nextState not in visitedCorners:
-                    visitiedCornersAppend = visitedCorners[:]
-                    visitiedCornersAppend.append(nextState)
-                    successors.append( ((nextState,visitiedCornersAppend), action, cost) )
+                    successors.append( ((nextState, visitedCorners + (nextState,)), action, cost) )
                 else:
                     successors.append( ((nextState,visitedCorners), action, cost) )
                 
@@ -387,10 +532,10 @@ def cornersHeuristic(state, problem):
         return 0
 
     #compute Manhattan Distance to all corners (that are not visited) and pick the least
+    distances = getMazeDistances(walls)
     for i in corners:
         if i not in visitedCorners:
-            prob = PositionSearchProblem(problem.startingGameState, start=state[0], goal=i, warn=False, visualize=False)
-            distance.append((len(search.bfs(prob))*100 + manhattanHeuristic_mod(state[0], i) + euclideanHeuristic_mod(state[0], i))/102)
+            distance.append((distances.dist(i, state[0])*100 + manhattanHeuristic_mod(state[0], i) + euclideanHeuristic_mod(state[0], i))/102)
 
     return max(distance)
 
@@ -405,12 +550,21 @@ class FoodSearchProblem:
     A search problem associated with finding the a path that collects all of the
     food (dots) in a Pacman game.
 
-    A search state in this problem is a tuple ( pacmanPosition, foodGrid ) where
+    A search state in this problem is a tuple ( pacmanPosition, foodMask ) where
       pacmanPosition: a tuple (x,y) of integers specifying Pacman's position
-      foodGrid:       a Grid (see game.py) of either True or False, specifying remaining food
+      foodMask:       an integer with bit i set while the food at
+                      problem.foodPositions[i] remains
+
+    Eating a dot clears one bit, and states hash and compare as cheaply as any
+    tuple of ints.  Use getFoodGrid(state) or getFoodList(state) to see the
+    remaining food as a Grid (see game.py) or a list of positions.
     """
     def __init__(self, startingGameState):
-        self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood())
+        food = startingGameState.getFood()
+        # Bit i of a food mask stands for the food at foodPositions[i]
+        self.foodPositions = tuple(food.asList())
+        self.foodBits = dict([(pos, 1 << i) for i, pos in enumerate(self.foodPositions)])
+        self.start = (startingGameState.getPacmanPosition(), (1 << len(self.foodPositions)) - 1)
         self.walls = startingGameState.getWalls()
         self.startingGameState = startingGameState
         self._expanded = 0 # DO NOT CHANGE
@@ -418,29 +572,44 @@ class FoodSearchProblem:
         
         self.visited = []
         self.queue = util.Queue()
-        self.pq = util.PriorityQueue()
 
     def getStartState(self):
         return self.start
 
     def isGoalState(self, state):
-        return state[1].count() == 0
+        return state[1] == 0
 
     def getSuccessors(self, state):
         "Returns successor states, the actions they require, and a cost of 1."
         successors = []
         self._expanded += 1 # DO NOT CHANGE
         
+        x,y = state[0]
         for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state[0]
             dx, dy = Actions.directionToVector(direction)
             nextx, nexty = int(x + dx), int(y + dy)
             if not self.walls[nextx][nexty]:
-                nextFood = state[1].copy()
-                nextFood[nextx][nexty] = False
+                nextFood = state[1] & ~self.foodBits.get((nextx, nexty), 0)
                 successors.append( ( ((nextx, nexty), nextFood), direction, 1) )
         return successors
 
+    def getFoodList(self, state):
+        "Returns the positions of the food remaining in state."
+        foodMask = state[1]
+        food = []
+        while foodMask:
+            lowest = foodMask & -foodMask
+            food.append(self.foodPositions[lowest.bit_length() - 1])
+            foodMask ^= lowest
+        return food
+
+    def getFoodGrid(self, state):
+        "Returns the food remaining in state as a Grid of booleans."
+        grid = Grid(self.walls.width, self.walls.height)
+        for x, y in self.getFoodList(state):
+            grid[x][y] = True
+        return grid
+
     def getCostOfActions(self, actions):
         """Returns the cost of a particular sequence of actions.  If those actions
         include an illegal move, return 999999"""
@@ -471,9 +640,10 @@ def foodHeuristic(state, problem):
     hand, inadmissible heuristics may occasionally find optimal
     solutions, so be careful.
 
-    The state is a tuple ( pacmanPosition, foodGrid ) where foodGrid is a Grid
-    (see game.py) of either True or False. You can call foodGrid.asList() to get
-    a list of food coordinates instead.
+    The state is a tuple ( pacmanPosition, foodMask ) where foodMask is an
+    integer bitmask over problem.foodPositions. You can call
+    problem.getFoodList(state) to get a list of food coordinates, or
+    problem.getFoodGrid(state) to get a Grid (see game.py) of True or False.
 
     If you want access to info like walls, capsules, etc., you can query the
     problem.  For example, problem.walls gives you a Grid of where the walls
@@ -487,22 +657,173 @@ def foodHeuristic(state, problem):
     problem.heuristicInfo['wallCount']
 
     """
-    position, foodGrid = state
-    food = list(foodGrid)
+    position = state[0]
     distance = []
 
     if problem.isGoalState(state):
         return 0
 
     #compute a real path to each point from current position and use the information as a heuristic
-    for i in range(len(food)):
-        for j in range(len(food[i])):
-            if food[i][j] == True:
-                prob = PositionSearchProblem(problem.startingGameState, start=position, goal=(i,j), warn=False, visualize=False)
-                distance.append((len(search.bfs(prob))*100 + manhattanHeuristic_mod(state[0], (i,j)) + euclideanHeuristic_mod(state[0], (i,j)))/102)
+    distances = getMazeDistances(problem.walls)
+    for food in problem.getFoodList(state):
+        distance.append((distances.dist(food, position)*100 + manhattanHeuristic_mod(position, food) + euclideanHeuristic_mod(position, food))/102)
 
     return max(distance)
 
+# Number of MST weights mstFoodHeuristic remembers per problem
+MST_CACHE_SIZE = 50000
+
+def mstFoodHeuristic(state, problem):
+    """
+    A FoodSearchProblem heuristic: the maze distance to the nearest dot plus
+    the weight of a minimum spanning tree over the remaining dots, with maze
+    distances as edge weights.
+
+    Any path that eats every dot first reaches some dot, and from there visits
+    the rest along a path that spans them, so this never overestimates.  It is
+    also consistent: a step changes the nearest distance by at most one, and
+    eating a dot lowers the MST weight by at most the distance from that dot
+    to the nearest remaining one.
+
+    MST weights only depend on the food, so they are kept in
+    problem.heuristicInfo['mst'] keyed by food mask and reused by every state
+    with the same food.  The least recently used entries are dropped beyond
+    MST_CACHE_SIZE.
+    """
+    position, foodMask = state
+    if foodMask == 0:
+        return 0
+    distances = getMazeDistances(problem.walls)
+    food = problem.getFoodList(state)
+
+    cache = problem.heuristicInfo.get('mst', None)
+    if cache is None:
+        cache = problem.heuristicInfo['mst'] = collections.OrderedDict()
+    weight = cache.pop(foodMask, None)
+    if weight is None:
+        weight = mstWeight(food, distances)
+        if len(cache) >= MST_CACHE_SIZE:
+            cache.popitem(last=False)
+    cache[foodMask] = weight
+
+    return min([distances.dist(dot, position) for dot in food]) + weight
+
+def mstWeight(points, distances):
+    "Returns the weight of a minimum spanning tree over points, using Prim's algorithm."
+    if not points:
+        return 0
+    fields = [distances.distanceField(p) for p in points]
+    indices = [distances.index(p) for p in points]
+    #best[i] is the cheapest edge from the tree to points[i]
+    best = [fields[0][i] for i in indices]
+    remaining = range(1, len(points))
+    weight = 0
+    while remaining:
+        nearest = min(remaining, key=lambda i: best[i])
+        remaining.remove(nearest)
+        weight += best[nearest]
+        field = fields[nearest]
+        for i in remaining:
+            if field[indices[i]] < best[i]:
+                best[i] = field[indices[i]]
+    return weight
+
+# Largest number of dots heldKarpSearch solves exactly; it takes about a second
+# at 16 dots and eight times as long for every three more
+HELD_KARP_MAX_FOOD = 16
+
+def heldKarpSearch(problem):
+    """
+    Solves a FoodSearchProblem exactly with bitmask dynamic programming
+    (Held-Karp) instead of searching over (position, food) states.
+
+    The maze is collapsed into a matrix of maze distances between Pacman and
+    the remaining dots, the best order in which to eat the dots is found over
+    subsets of the dots, and each leg of that order is expanded back into
+    Pacman actions.  This takes O(2^n * n^2) time for n dots, so with more
+    than HELD_KARP_MAX_FOOD dots it falls back to A* with foodHeuristic.
+
+    > python pacman.py -l trickySearch -p SearchAgent -a fn=heldKarpSearch,prob=FoodSearchProblem
+    """
+    start = problem.getStartState()
+    food = problem.getFoodList(start)
+    if len(food) > HELD_KARP_MAX_FOOD:
+        return search.aStarSearch(problem, foodHeuristic)
+
+    metrics = search.newMetrics('heldKarpSearch')
+    distances = getMazeDistances(problem.walls)
+    position = start[0]
+    fromStart = [distances.dist(position, dot) for dot in food]
+    between = [[distances.dist(dot, other) for other in food] for dot in food]
+    order = heldKarpOrder(fromStart, between)
+    metrics.finish()
+    if order is None:
+        #some dot can't be reached, return empty path
+        return []
+
+    actions = []
+    for i in order:
+        actions += distances.path(position, food[i])
+        position = food[i]
+    return actions
+
+def heldKarpOrder(fromStart, between):
+    """
+    Returns the order (a list of indices) in which to visit every node so that
+    the total distance is smallest, or None if some node can't be reached.
+
+      fromStart: fromStart[i] is the distance from the start to node i
+      between:   between[i][j] is the distance from node i to node j
+
+    cost[mask][j] is the length of the shortest walk from the start through
+    exactly the nodes in mask that ends at j; cost[mask | 1 << k][k] follows by
+    extending those walks by one more node.
+    """
+    n = len(fromStart)
+    if n == 0: return []
+    unreachable = sys.maxint
+    full = (1 << n) - 1
+    cost = [None] * (full + 1)
+    parent = [None] * (full + 1)
+    for j in range(n):
+        cost[1 << j] = array.array('l', [unreachable]) * n
+        if fromStart[j] < unreachable: cost[1 << j][j] = fromStart[j]
+        parent[1 << j] = array.array('b', [-1]) * n
+    bits = [1 << k for k in range(n)]
+    toNode = [[between[j][k] for j in range(n)] for k in range(n)]
+
+    for mask in xrange(1, full):
+        row = cost[mask]
+        ends = [j for j in range(n) if mask & bits[j] and row[j] < unreachable]
+        for k in range(n):
+            if mask & bits[k]: continue
+            nextMask = mask | bits[k]
+            nextRow = cost[nextMask]
+            if nextRow is None:
+                nextRow = cost[nextMask] = array.array('l', [unreachable]) * n
+                parent[nextMask] = array.array('b', [-1]) * n
+            bestCost, bestEnd = nextRow[k], -1
+            toK = toNode[k]
+            for j in ends:
+                c = row[j] + toK[j]
+                if c < bestCost:
+                    bestCost, bestEnd = c, j
+            if bestEnd >= 0:
+                nextRow[k] = bestCost
+                parent[nextMask][k] = bestEnd
+        #every walk through mask has been extended; only its parents are needed now
+        cost[mask] = None
+
+    last = min(range(n), key=lambda j: cost[full][j])
+    if cost[full][last] >= unreachable: return None
+    order = []
+    mask = full
+    while last != -1:
+        order.append(last)
+        last, mask = parent[mask][last], mask & ~bits[last]
+    order.reverse()
+    return order
+
 class ClosestDotSearchAgent(SearchAgent):
     "Search for all food using a sequence of searches"
     def registerInitialState(self, state):
@@ -631,11 +952,368 @@ def mazeDistance(point1, point2, gameState):
     Example usage: mazeDistance( (2,4), (5,6), gameState)
 
     This might be a useful helper function for your ApproximateSearchAgent.
+
+    Distances come from the MazeDistances table for the layout's walls, so
+    only the first call from each point pays for a breadth first search.
     """
     x1, y1 = point1
     x2, y2 = point2
     walls = gameState.getWalls()
     assert not walls[x1][y1], 'point1 is a wall: ' + str(point1)
     assert not walls[x2][y2], 'point2 is a wall: ' + str(point2)
-    prob = PositionSearchProblem(gameState, start=point1, goal=point2, warn=False, visualize=False)
-    return len(search.bfs(prob))
+    return getMazeDistances(walls).dist(point1, point2)
+
+class MazeDistances:
+    """
+    An all-pairs maze distance oracle for one walls Grid.
+
+    Every open cell gets a compact index.  The distance field of a cell (its
+    breadth first search distance to every other open cell) is stored as an
+    array of unsigned shorts indexed by cell, filled in the first time that
+    cell is used as a source.  After that dist(a, b) is two array lookups.
+
+    Use getMazeDistances(walls) rather than constructing this directly, so the
+    table is shared by every search on the same layout.
+    """
+    UNREACHABLE = 0xFFFF
+
+    def __init__(self, walls):
+        self.walls = walls
+        self.width, self.height = walls.width, walls.height
+        # Open cell index for every (x, y), or -1 for walls
+        self.cellIndex = array.array('i', [-1]) * (self.width * self.height)
+        self.cells = []
+        for x in range(self.width):
+            for y in range(self.height):
+                if not walls[x][y]:
+                    self.cellIndex[x * self.height + y] = len(self.cells)
+                    self.cells.append((x, y))
+        self.neighbors = []
+        for x, y in self.cells:
+            adjacent = []
+            for nextx, nexty in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                if 0 <= nextx < self.width and 0 <= nexty < self.height:
+                    i = self.cellIndex[nextx * self.height + nexty]
+                    if i >= 0: adjacent.append(i)
+            self.neighbors.append(tuple(adjacent))
+        self.fields = [None] * len(self.cells)
+
+    def index(self, pos):
+        "Returns the open cell index of pos.  Raises KeyError for walls."
+        x, y = pos
+        i = self.cellIndex[int(x) * self.height + int(y)]
+        if i < 0: raise KeyError('not an open cell: ' + str(pos))
+        return i
+
+    def distanceField(self, pos):
+        """
+        Returns the distances from pos to every open cell, as an array indexed
+        by open cell index (see index and cells).  Unreachable cells hold
+        MazeDistances.UNREACHABLE.
+        """
+        source = self.index(pos)
+        field = self.fields[source]
+        if field is None:
+            field = self._bfs(source)
+            self.fields[source] = field
+        return field
+
+    def dist(self, a, b):
+        "Returns the maze distance from a to b, or infinity if b can't be reached."
+        d = self.distanceField(a)[self.index(b)]
+        if d == MazeDistances.UNREACHABLE: return float('inf')
+        return d
+
+    def path(self, a, b):
+        """
+        Returns a shortest list of actions from a to b, following the distance
+        field of b downhill.  Returns None if b can't be reached.
+        """
+        field = self.distanceField(b)
+        x, y = a
+        remaining = field[self.index(a)]
+        if remaining == MazeDistances.UNREACHABLE: return None
+        actions = []
+        while remaining > 0:
+            for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+                dx, dy = Actions.directionToVector(action)
+                nextx, nexty = int(x + dx), int(y + dy)
+                if not (0 <= nextx < self.width and 0 <= nexty < self.height): continue
+                i = self.cellIndex[nextx * self.height + nexty]
+                if i >= 0 and field[i] == remaining - 1:
+                    break
+            else:
+                raise Exception, 'no neighbor of %s is closer to %s' % (str((x, y)), str(b))
+            actions.append(action)
+            x, y, remaining = nextx, nexty, remaining - 1
+        return actions
+
+    def _bfs(self, source):
+        field = array.array('H', [MazeDistances.UNREACHABLE]) * len(self.cells)
+        field[source] = 0
+        neighbors = self.neighbors
+        frontier = [source]
+        distance = 0
+        while frontier:
+            distance += 1
+            nextFrontier = []
+            for cell in frontier:
+                for adjacent in neighbors[cell]:
+                    if field[adjacent] == MazeDistances.UNREACHABLE:
+                        field[adjacent] = distance
+                        nextFrontier.append(adjacent)
+            frontier = nextFrontier
+        return field
+
+# Number of tables of each kind (MazeDistances, MazeGraph) kept alive; the
+# least recently used goes first
+MAX_DISTANCE_TABLES = 8
+_distanceTables = collections.OrderedDict()
+
+def getMazeDistances(walls):
+    """
+    Returns the MazeDistances for a walls Grid, built at most once per layout.
+
+    Tables are kept in a small LRU keyed by the hash of the walls, so repeated
+    searches on the same layout (even through copies of its walls) share one
+    table.
+    """
+    return cachedForWalls(_distanceTables, walls, MazeDistances)
+
+def cachedForWalls(cache, walls, build):
+    """
+    Returns build(walls), reusing the copy in cache (an OrderedDict used as an
+    LRU) if one was built for equal walls.
+    """
+    if cache:
+        key = next(reversed(cache))
+        if cache[key].walls is walls:
+            return cache[key]
+    key = (walls.width, walls.height, hash(walls))
+    table = cache.pop(key, None)
+    if table is None or table.walls != walls:
+        table = build(walls)
+    cache[key] = table
+    while len(cache) > MAX_DISTANCE_TABLES:
+        cache.popitem(last=False)
+    return table
+
+class MazeGraph:
+    """
+    The open cells of a walls Grid contracted into a graph of corridors.
+
+    Nodes are junctions (three or more open neighbors), dead ends, isolated
+    cells, and one cell of every loop that has neither.  All other cells have
+    exactly two open neighbors and lie on a corridor between two nodes.
+
+      corridors[i]:       the cells of corridor i in order; the first and last
+                          are nodes (the same one for a loop)
+      corridorActions[i]: corridorActions[i][k] moves from corridors[i][k] to
+                          corridors[i][k + 1]
+      incident[node]:     (corridor index, True if node is its first cell) for
+                          every corridor leaving node
+      location[cell]:     (corridor index, offset) of every corridor cell
+
+    Use getMazeGraph(walls) rather than constructing this directly, and
+    ContractedSearchProblem to search over it.
+    """
+    def __init__(self, walls):
+        self.walls = walls
+        self.corridors = []
+        self.corridorActions = []
+        self.incident = {}
+        self.location = {}
+
+        openCells = walls.asList(False)
+        exits = dict([(cell, self.exits(cell)) for cell in openCells])
+        for cell in openCells:
+            if len(exits[cell]) != 2:
+                self.incident[cell] = []
+        traced = set()
+        for node in openCells:
+            if node in self.incident:
+                self._traceFrom(node, exits, traced)
+        for cell in openCells:
+            if cell not in self.incident and cell not in self.location:
+                #a loop with no junction, anchored at its first cell
+                self.incident[cell] = []
+                self._traceFrom(cell, exits, traced)
+
+    def exits(self, cell):
+        "Returns (cell, action) for every open cell next to cell."
+        x, y = cell
+        exits = []
+        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+            dx, dy = Actions.directionToVector(action)
+            nextx, nexty = int(x + dx), int(y + dy)
+            if 0 <= nextx < self.walls.width and 0 <= nexty < self.walls.height and not self.walls[nextx][nexty]:
+                exits.append(((nextx, nexty), action))
+        return exits
+
+    def _traceFrom(self, node, exits, traced):
+        for nextCell, action in exits[node]:
+            if (node, action) in traced:
+                continue
+            cells, actions = [node, nextCell], [action]
+            while cells[-1] not in self.incident:
+                for following, nextAction in exits[cells[-1]]:
+                    if following != cells[-2]:
+                        break
+                cells.append(following)
+                actions.append(nextAction)
+            traced.add((node, action))
+            traced.add((cells[-1], Directions.REVERSE[actions[-1]]))
+            i = len(self.corridors)
+            self.corridors.append(cells)
+            self.corridorActions.append(actions)
+            self.incident[node].append((i, True))
+            self.incident[cells[-1]].append((i, False))
+            for offset in range(1, len(cells) - 1):
+                self.location[cells[offset]] = (i, offset)
+
+_mazeGraphs = collections.OrderedDict()
+
+def getMazeGraph(walls):
+    "Returns the MazeGraph for a walls Grid, built at most once per layout."
+    return cachedForWalls(_mazeGraphs, walls, MazeGraph)
+
+class ContractedSearchProblem(search.SearchProblem):
+    """
+    Presents a grid search problem on the MazeGraph of its walls.
+
+    Search states are the states of the wrapped problem, but only at nodes of
+    the graph and at key cells: the start and its neighbors, and every cell
+    where the state can change other than by moving (goals, corners, food).  An action is a tuple
+    of the Pacman actions along one corridor segment, which costs the sum of
+    the wrapped problem's step costs.  Use expandActions to turn a solution
+    back into Pacman actions.
+
+      getPosition(state):   Pacman's position in a wrapped problem state
+      stateAt(state, cell): the state after walking from state's position to
+                            cell, where cell is the first key cell on the way
+
+    Other attributes (walls, goal, heuristicInfo, ...) are read from the
+    wrapped problem, so its heuristics work unchanged.
+    """
+    def __init__(self, problem, keyCells, getPosition=lambda state: state, stateAt=lambda state, cell: cell):
+        self.problem = problem
+        self.graph = getMazeGraph(problem.walls)
+        self.getPosition = getPosition
+        self.stateAt = stateAt
+        self.stepCostFn = getattr(problem, 'costFn', None)
+        # Sorted offsets of the key cells inside each corridor.  Pacman may need
+        # to step off the start and straight back onto it (CornersProblem only
+        # counts the start corner once Pacman returns to it), so the cells
+        # next to the start are key cells too.
+        start = getPosition(problem.getStartState())
+        self.keyOffsets = {}
+        for cell in list(keyCells) + [start] + [c for c, a in self.graph.exits(start)]:
+            if cell in self.graph.location:
+                i, offset = self.graph.location[cell]
+                offsets = self.keyOffsets.setdefault(i, [])
+                if offset not in offsets:
+                    bisect.insort(offsets, offset)
+        self.stops = {}
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+    def getStartState(self):
+        return self.problem.getStartState()
+
+    def isGoalState(self, state):
+        return self.problem.isGoalState(state)
+
+    def getSuccessors(self, state):
+        "Returns a successor for the next key cell or node along every corridor."
+        position = self.getPosition(state)
+        successors = []
+        for cell, actions, cost in self.getStops(position):
+            successors.append((self.stateAt(state, cell), actions, cost))
+
+        # Bookkeeping for display purposes
+        self.problem._expanded += 1
+        visited = getattr(self.problem, '_visited', None)
+        if visited is not None and position not in visited:
+            visited[position] = True
+            self.problem._visitedlist.append(position)
+        return successors
+
+    def getStops(self, position):
+        "Returns (cell, actions, cost) for the next stop in every direction from position."
+        if position in self.stops:
+            return self.stops[position]
+        graph = self.graph
+        if position in graph.location:
+            i, offset = graph.location[position]
+            walks = [(i, offset, 1), (i, offset, -1)]
+        else:
+            walks = []
+            for i, isFirst in graph.incident[position]:
+                if isFirst: walks.append((i, 0, 1))
+                else: walks.append((i, len(graph.corridors[i]) - 1, -1))
+
+        stops = []
+        for i, offset, step in walks:
+            cells, actions = graph.corridors[i], graph.corridorActions[i]
+            keys = self.keyOffsets.get(i, [])
+            if step == 1:
+                k = bisect.bisect_right(keys, offset)
+                end = keys[k] if k < len(keys) else len(cells) - 1
+                path = tuple(actions[offset:end])
+                entered = cells[offset + 1:end + 1]
+            else:
+                k = bisect.bisect_left(keys, offset) - 1
+                end = keys[k] if k >= 0 else 0
+                path = tuple([Directions.REVERSE[a] for a in reversed(actions[end:offset])])
+                entered = cells[end:offset]
+            if self.stepCostFn is None:
+                cost = len(path)
+            else:
+                cost = sum([self.stepCostFn(cell) for cell in entered])
+            stops.append((cells[end], path, cost))
+        self.stops[position] = stops
+        return stops
+
+    def expandActions(self, actions):
+        "Returns the Pacman actions along a list of corridor segments."
+        path = []
+        for segment in actions:
+            path.extend(segment)
+        return path
+
+    def getCostOfActions(self, actions):
+        return self.problem.getCostOfActions(self.expandActions(actions))
+
+def contractedProblem(problem):
+    """
+    Returns a ContractedSearchProblem for a PositionSearchProblem,
+    AnyFoodSearchProblem, CornersProblem or FoodSearchProblem.
+    """
+    if isinstance(problem, CornersProblem):
+        def stateAt(state, cell):
+            if cell in problem.corners and cell not in state[1]:
+                return (cell, state[1] + (cell,))
+            return (cell, state[1])
+        return ContractedSearchProblem(problem, problem.corners, lambda state: state[0], stateAt)
+    if isinstance(problem, FoodSearchProblem):
+        stateAt = lambda state, cell: (cell, state[1] & ~problem.foodBits.get(cell, 0))
+        return ContractedSearchProblem(problem, problem.foodPositions, lambda state: state[0], stateAt)
+    if isinstance(problem, AnyFoodSearchProblem):
+        return ContractedSearchProblem(problem, problem.food.asList())
+    if isinstance(problem, PositionSearchProblem):
+        return ContractedSearchProblem(problem, [problem.goal])
+    raise Exception, 'No contracted form for ' + problem.__class__.__name__
+
+def contractedSearch(problem, heuristic=search.nullHeuristic):
+    """
+    Runs A* (uniform cost search with the default heuristic) on the MazeGraph
+    of a grid problem, so whole corridors are crossed in one step, and returns
+    the ordinary Pacman actions of the path found.
+
+    > python pacman.py -l mediumCorners -p SearchAgent -a fn=contractedSearch,prob=CornersProblem
+    """
+    contracted = contractedProblem(problem)
+    actions = contracted.expandActions(search.aStarSearch(contracted, heuristic))
+    if search.lastMetrics is not None: search.lastMetrics.algorithm = 'contractedSearch'
+    return actions
@@ -0,0 +1,332 @@
+# batchGames.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+BatchGames plays many games of the same layout in lockstep, for tuning
+evaluation functions over thousands of games without a GameState per move.
+
+The state of all the games is held column by column: one list per
+feature with an entry per game (Pacman's position, the ghosts' positions,
+directions and scared timers, the food and capsules left, the score).
+Food and capsules are bitboards, one Python integer per game with a bit per
+cell.  Each move is played for all the games still running before the
+next agent moves, and the ghost policies are computed for all of those
+games in one call.
+
+Positions are measured in half squares, because scared ghosts move at half
+speed, and packed into one integer, X * 2 * layout.height + Y, so a move is
+an addition and the legal actions of every position are looked up in
+tables built once per layout.
+
+The rules are those of PacmanRules and GhostRules in pacman.py, and the
+ghosts are RandomGhost and DirectionalGhost from ghostAgents.py.  Each game
+draws its ghost moves from its own random.Random, seeded with
+pacman.gameSeed(seed, game), so a game plays out the same whatever the size
+of the batch, and exactly like a Game played by the same agents after
+random.seed(pacman.gameSeed(seed, game)) if Pacman's policy does not use
+the random module.
+
+  > batch = BatchGames(layout.getLayout('mediumClassic'), 1000, 'DirectionalGhost')
+  > scores = batch.play(lambda batch: [random.choice(legal) for legal in batch.getLegalPacmanActions()])
+"""
+
+from game import Directions, Actions
+from pacman import GameState, gameSeed, SCARED_TIME, TIME_PENALTY
+import util
+import random
+
+# The order util.sample sees actions in: it sorts the Counter a ghost builds
+SAMPLE_ORDER = sorted([Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST])
+
+class BatchGames:
+    """
+    N games of one layout played in lockstep (see the module docstring).
+
+    Game g is over once wins[g] or loses[g] is set; live lists the games
+    still being played, in order.  All the per-game lists are indexed by
+    game, not by position in live.
+    """
+
+    def __init__( self, layout, numGames, ghostType='RandomGhost', numGhosts=4, seed=None, prob_attack=0.8, prob_scaredFlee=0.8 ):
+        if ghostType not in BatchGames.GHOST_POLICIES:
+            raise Exception, 'BatchGames has no batch policy for ' + ghostType
+        self.layout = layout
+        self.ghostPolicy = BatchGames.GHOST_POLICIES[ghostType]
+        self.prob_attack = prob_attack
+        self.prob_scaredFlee = prob_scaredFlee
+        if seed == None: seed = random.randrange(2 ** 31)
+        self.seed = seed
+        self.buildTables()
+
+        start = GameState()
+        start.initialize( layout, numGhosts )
+        self.numGhosts = start.getNumAgents() - 1
+        positions = [self.encode(agentState.start.pos) for agentState in start.data.agentStates]
+        self.ghostStarts = positions[1:]
+        food = 0
+        for x, y in layout.food.asList(): food |= 1 << self.cellBit[self.encode((x, y))]
+        capsules = 0
+        for x, y in layout.capsules: capsules |= 1 << self.cellBit[self.encode((x, y))]
+
+        self.numGames = numGames
+        self.randoms = [random.Random(gameSeed(seed, game)) for game in range(numGames)]
+        self.pacman = [positions[0]] * numGames
+        self.pacmanDirections = [Directions.STOP] * numGames
+        self.ghosts = [positions[1:] for game in range(numGames)]
+        self.ghostDirections = [[Directions.STOP] * self.numGhosts for game in range(numGames)]
+        self.scaredTimers = [[0] * self.numGhosts for game in range(numGames)]
+        self.food = [food] * numGames
+        self.capsules = [capsules] * numGames
+        self.scores = [0] * numGames
+        self.moves = [0] * numGames
+        self.wins = [False] * numGames
+        self.loses = [False] * numGames
+        self.live = range(numGames)
+
+    def buildTables( self ):
+        """
+        Builds the tables of moves, legal actions and food bits of every
+        position on the layout.
+        """
+        walls = self.layout.walls
+        self.stride = 2 * walls.height
+        self.deltas = {}
+        for action, (dx, dy) in Actions._directionsAsList:
+            self.deltas[action] = dx * self.stride + dy
+
+        # Indexed by position; only squares (not half squares) have entries
+        size = 2 * walls.width * self.stride
+        self.cellBit = [None] * size
+        self.pacmanLegal = [None] * size
+        self.ghostLegal = [None] * size
+        for x in range(walls.width):
+            for y in range(walls.height):
+                if walls[x][y]: continue
+                position = self.encode((x, y))
+                self.cellBit[position] = x * walls.height + y
+                possible = [action for action, (dx, dy) in Actions._directionsAsList
+                            if not walls[x + dx][y + dy]]
+                self.pacmanLegal[position] = possible
+                legal = {}
+                for direction in self.deltas:
+                    actions = [action for action in possible if action != Directions.STOP]
+                    reverse = Actions.reverseDirection(direction)
+                    if reverse in actions and len(actions) > 1: actions.remove(reverse)
+                    legal[direction] = actions
+                self.ghostLegal[position] = legal
+
+        # RandomGhost's cumulative distribution over n legal actions, summed
+        # exactly as util.sample sums it
+        self.uniformTotals = [None]
+        for n in range(1, 5):
+            self.uniformTotals.append(cumulative(normalized([1.0] * n)))
+
+    def encode( self, position ):
+        "The packed form of an (x, y) position"
+        x, y = position
+        return int(2 * x) * self.stride + int(2 * y)
+
+    def decode( self, position ):
+        "The (x, y) position of a packed position"
+        X, Y = divmod(position, self.stride)
+        return (X / 2.0, Y / 2.0)
+
+    def getLegalPacmanActions( self ):
+        "Pacman's legal actions in each live game, in the order of live"
+        pacmanLegal, pacman = self.pacmanLegal, self.pacman
+        return [pacmanLegal[pacman[game]] for game in self.live]
+
+    def getPacmanPosition( self, game ):
+        return self.decode(self.pacman[game])
+
+    def getGhostPositions( self, game ):
+        return [self.decode(position) for position in self.ghosts[game]]
+
+    def getFood( self, game ):
+        "The (x, y) squares that still have food in a game"
+        height = self.layout.height
+        food = self.food[game]
+        return [divmod(bit, height) for bit in range(self.layout.width * height) if food >> bit & 1]
+
+    def getNumFood( self, game ):
+        return bin(self.food[game]).count('1')
+
+    def play( self, policy ):
+        """
+        Plays every game to the end, asking policy(self) for Pacman's
+        actions in the live games before each round, and returns the scores.
+        """
+        while self.live:
+            self.step(policy(self))
+        return self.scores
+
+    def step( self, actions ):
+        """
+        Plays one round of every live game: Pacman takes actions[i] in game
+        live[i], then each ghost moves in the games still running.
+        """
+        if len(actions) != len(self.live):
+            raise Exception, 'Expected %d actions, got %d' % (len(self.live), len(actions))
+        running = []
+        for game, action in zip(self.live, actions):
+            if self.movePacman(game, action): running.append(game)
+        for ghost in range(self.numGhosts):
+            if not running: break
+            ghostActions = self.ghostPolicy(self, ghost, running)
+            running = [game for game, action in zip(running, ghostActions) if self.moveGhost(game, ghost, action)]
+        self.live = [game for game in self.live if not (self.wins[game] or self.loses[game])]
+
+    def movePacman( self, game, action ):
+        """
+        PacmanRules.applyAction, the time penalty and GhostRules.checkDeath
+        for Pacman's move in one game.  Returns whether the game goes on.
+        """
+        position = self.pacman[game]
+        if action not in self.pacmanLegal[position]:
+            raise Exception, 'Illegal action ' + str(action)
+        position += 2 * self.deltas[action]
+        self.pacman[game] = position
+        if action != Directions.STOP: self.pacmanDirections[game] = action
+        self.moves[game] += 1
+        scoreChange = -TIME_PENALTY
+
+        bit = 1 << self.cellBit[position]
+        if self.food[game] & bit:
+            self.food[game] ^= bit
+            scoreChange += 10
+            if not self.food[game]:
+                scoreChange += 500
+                self.wins[game] = True
+        if self.capsules[game] & bit:
+            self.capsules[game] ^= bit
+            self.scaredTimers[game] = [SCARED_TIME] * self.numGhosts
+
+        for ghost in range(self.numGhosts):
+            scoreChange += self.checkDeath(game, ghost)
+        self.scores[game] += scoreChange
+        return not (self.wins[game] or self.loses[game])
+
+    def moveGhost( self, game, ghost, action ):
+        """
+        GhostRules.applyAction, decrementTimer and checkDeath for one ghost's
+        move in one game.  Returns whether the game goes on.
+        """
+        ghosts, timers = self.ghosts[game], self.scaredTimers[game]
+        if action != Directions.STOP:
+            self.ghostDirections[game][ghost] = action
+            if timers[ghost] > 0:
+                ghosts[ghost] += self.deltas[action]
+            else:
+                ghosts[ghost] += 2 * self.deltas[action]
+        if timers[ghost] > 0:
+            if timers[ghost] == 1:
+                X, Y = divmod(ghosts[ghost], self.stride)
+                ghosts[ghost] = (X + X % 2) * self.stride + Y + Y % 2
+            timers[ghost] -= 1
+        scoreChange = self.checkDeath(game, ghost)
+        self.scores[game] += scoreChange
+        return not (self.wins[game] or self.loses[game])
+
+    def checkDeath( self, game, ghost ):
+        "GhostRules.collide for one ghost if it touches Pacman.  Returns the score change."
+        X, Y = divmod(self.pacman[game], self.stride)
+        ghostX, ghostY = divmod(self.ghosts[game][ghost], self.stride)
+        if abs(X - ghostX) + abs(Y - ghostY) > 1: return 0
+        if self.scaredTimers[game][ghost] > 0:
+            self.ghosts[game][ghost] = self.ghostStarts[ghost]
+            self.ghostDirections[game][ghost] = Directions.STOP
+            self.scaredTimers[game][ghost] = 0
+            return 200
+        if self.wins[game]: return 0
+        self.loses[game] = True
+        return -500
+
+    def getGhostLegalActions( self, game, ghost ):
+        "GhostRules.getLegalActions"
+        position = self.ghosts[game][ghost]
+        legal = self.ghostLegal[position]
+        if legal is None: # between squares, ghosts keep going
+            return [self.ghostDirections[game][ghost]]
+        return legal[self.ghostDirections[game][ghost]]
+
+    def randomGhostActions( self, ghost, games ):
+        "RandomGhost's action in each of the games"
+        actions = []
+        for game in games:
+            legal = self.getGhostLegalActions(game, ghost)
+            if not legal:
+                actions.append(Directions.STOP)
+                continue
+            legal = [action for action in SAMPLE_ORDER if action in legal]
+            actions.append(legal[draw(self.randoms[game].random(), self.uniformTotals[len(legal)])])
+        return actions
+
+    def directionalGhostActions( self, ghost, games ):
+        "DirectionalGhost's action in each of the games"
+        actions = []
+        stride = self.stride
+        for game in games:
+            legal = self.getGhostLegalActions(game, ghost)
+            if not legal:
+                actions.append(Directions.STOP)
+                continue
+            legal = [action for action in SAMPLE_ORDER if action in legal]
+            position = self.ghosts[game][ghost]
+            X, Y = divmod(self.pacman[game], stride)
+            isScared = self.scaredTimers[game][ghost] > 0
+            speed = 1 + (not isScared)
+            distances = []
+            for action in legal:
+                ghostX, ghostY = divmod(position + speed * self.deltas[action], stride)
+                distances.append(abs(ghostX - X) + abs(ghostY - Y))
+            if isScared:
+                bestScore = max(distances)
+                bestProb = self.prob_scaredFlee
+            else:
+                bestScore = min(distances)
+                bestProb = self.prob_attack
+            numBest = distances.count(bestScore)
+            distribution = []
+            for distance in distances:
+                probability = 0
+                if distance == bestScore: probability = bestProb / numBest
+                distribution.append(probability + (1 - bestProb) / len(legal))
+            distribution = normalized(distribution)
+            actions.append(legal[draw(self.randoms[game].random(), cumulative(distribution))])
+        return actions
+
+    GHOST_POLICIES = {'RandomGhost': randomGhostActions,
+                      'DirectionalGhost': directionalGhostActions}
+
+def normalized( distribution ):
+    "Counter.normalize, then the normalization util.sample does if the total isn't 1"
+    total = float(sum(distribution))
+    distribution = [probability / total for probability in distribution]
+    if sum(distribution) != 1: distribution = util.normalize(distribution)
+    return distribution
+
+def cumulative( distribution ):
+    "The running totals util.sample compares its random number with"
+    totals = []
+    total = 0
+    for probability in distribution:
+        total += probability
+        totals.append(total)
+    return totals
+
+def draw( choice, totals ):
+    "The index util.sample picks for a random number and a list of running totals"
+    i = 0
+    while choice > totals[i] and i < len(totals) - 1: i += 1
+    return i
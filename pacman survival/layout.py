@@ -14,10 +14,20 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import Actions, Configuration, Directions, ZobristKeys
 import os
 import random
+import hashlib
+import cPickle
 
+# Visibility matrices by layout digest, and the format of the cache files
+# initializeVisibilityMatrix(useCacheFile=True) saves next to the .lay files
 VISIBILITY_MATRIX_CACHE = {}
+VISIBILITY_FILE_VERSION = 2
+# Move tables (see buildMoveTables) by layout digest
+MOVE_TABLES_CACHE = {}
+# Zobrist keys (see buildZobristKeys) by layout size and number of agents
+ZOBRIST_KEYS_CACHE = {}
 
 class Layout:
     """
@@ -35,31 +45,161 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
-        # self.initializeVisibilityMatrix()
+        self.name = None # The layout file name, if loaded from one
+        self.filename = None # and its path
+        self.visibility = None # see initializeVisibilityMatrix
+        self.buildMoveTables()
+        self.buildZobristKeys()
 
     def getNumGhosts(self):
         return self.numGhosts
 
-    def initializeVisibilityMatrix(self):
-        global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5,0), (0.5,0),(0,-0.5),(0,0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH, Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH:set(), Directions.SOUTH:set(), Directions.EAST:set(), Directions.WEST:set(), Directions.STOP:set()})
-            for x in range(self.width):
-                for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)] :
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
+    def digest(self):
+        "A hash of the layout text, the same in every process"
+        return hashlib.sha1('\n'.join(self.layoutText)).hexdigest()
+
+    def initializeVisibilityMatrix(self, useCacheFile=False):
+        """
+        Sets visibility[x][y][direction] to the set of positions, in half
+        square steps, an agent on square (x, y) facing direction can see: a
+        straight line up to the first wall.  Nothing is visible facing STOP.
+
+        Matrices are cached by digest.  Only with useCacheFile are they also
+        kept in a .vis file next to the layout's .lay file, so a layout is
+        only walked once across runs.
+        """
+        digest = self.digest()
+        if digest not in VISIBILITY_MATRIX_CACHE:
+            vis = useCacheFile and self.loadVisibilityMatrix(digest)
+            if not vis:
+                vis = self.computeVisibilityMatrix()
+                if useCacheFile: self.saveVisibilityMatrix(digest, vis)
+            VISIBILITY_MATRIX_CACHE[digest] = vis
+        self.visibility = VISIBILITY_MATRIX_CACHE[digest]
+
+    def computeVisibilityMatrix(self):
+        directions = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]
+        vis = [[None] * self.height for x in range(self.width)]
+        for x in range(self.width):
+            for y in range(self.height):
+                if self.walls[x][y]: continue
+                vis[x][y] = {Directions.STOP: set()}
+                for direction in directions:
+                    dx, dy = Actions.directionToVector(direction, 0.5)
+                    visible = set()
+                    nextx, nexty = x + dx, y + dy
+                    # Halfway between squares nothing blocks the view
+                    while 0 <= nextx < self.width and 0 <= nexty < self.height and \
+                          ((nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]):
+                        visible.add((nextx, nexty))
+                        nextx, nexty = nextx + dx, nexty + dy
+                    vis[x][y][direction] = visible
+        return vis
+
+    def visibilityFilename(self):
+        if self.filename == None: return None
+        return self.filename[:-len('.lay')] + '.vis'
+
+    def visibilityFileHeader(self, digest):
+        return 'visibility %d %s\n' % (VISIBILITY_FILE_VERSION, digest)
+
+    def loadVisibilityMatrix(self, digest):
+        """
+        The visibility matrix in the layout's cache file, if it has an up to
+        date one.  The file starts with a plain text header naming the
+        digest, and the matrix is only unpickled if it is this layout's.
+        """
+        filename = self.visibilityFilename()
+        if filename == None or not os.path.exists(filename): return None
+        try:
+            f = open(filename, 'rb')
+            try:
+                if f.readline() != self.visibilityFileHeader(digest): return None
+                return cPickle.load(f)
+            finally: f.close()
+        except Exception:
+            return None
+
+    def saveVisibilityMatrix(self, digest, vis):
+        "Writes the layout's cache file, unless its directory is read-only"
+        filename = self.visibilityFilename()
+        if filename == None: return
+        try:
+            f = open(filename, 'wb')
+            try:
+                f.write(self.visibilityFileHeader(digest))
+                cPickle.dump(vis, f, cPickle.HIGHEST_PROTOCOL)
+            finally: f.close()
+        except IOError:
+            pass
+
+    def buildMoveTables(self):
+        """
+        Numbers the open squares and tabulates the moves out of each of them,
+        so the rules look legal actions up instead of checking walls on
+        every call.  For the square numbered cell:
+
+          cellPositions[cell]    its (x, y) position (cellIds maps back)
+          neighborIds[cell]      the cells Actions.getLegalNeighbors returns
+          possibleActions[cell]  Actions.getPossibleActions of an agent on it
+          ghostActions[cell]     the actions of a ghost on it, which cannot
+                                 stop or turn around, by the ghost's direction
+
+        The lists are in the order of the functions they replace.  Tables
+        are cached by digest and shared by every copy of the layout, so copy
+        a list before changing it.  Positions between squares have no cell.
+        The walls grid keeps the tables as moveTables for getLegalNeighbors.
+        """
+        digest = self.digest()
+        if digest not in MOVE_TABLES_CACHE:
+            MOVE_TABLES_CACHE[digest] = self.computeMoveTables()
+        tables = MOVE_TABLES_CACHE[digest]
+        self.cellIds, self.cellPositions, self.neighborIds, self.possibleActions, self.ghostActions = tables
+        self.walls.moveTables = tables
+
+    def buildZobristKeys(self):
+        """
+        Sets zobristKeys to the keys GameStateData hashes the states of the
+        layout with, shared by every layout of the same size.
+        """
+        size = (self.width, self.height, len(self.agentPositions))
+        if size not in ZOBRIST_KEYS_CACHE:
+            ZOBRIST_KEYS_CACHE[size] = ZobristKeys(*size)
+        self.zobristKeys = ZOBRIST_KEYS_CACHE[size]
+
+    def computeMoveTables(self):
+        cellIds = {}
+        cellPositions = []
+        for x in range(self.width):
+            for y in range(self.height):
+                if self.walls[x][y]: continue
+                cellIds[(x, y)] = len(cellPositions)
+                cellPositions.append((x, y))
+
+        neighborIds = []
+        possibleActions = []
+        ghostActions = []
+        directions = [direction for direction, vector in Actions._directionsAsList]
+        edges = []
+        for position in cellPositions:
+            neighbors = Actions.getLegalNeighbors(position, self.walls)
+            neighborIds.append([cellIds[neighbor] for neighbor in neighbors])
+            try:
+                possible = Actions.getPossibleActions(Configuration(position, Directions.STOP), self.walls)
+            except IndexError: # an open square on the edge of the board
+                edges.append(position)
+                possible = []
+            possibleActions.append(possible)
+            byDirection = {}
+            for direction in directions:
+                actions = [action for action in possible if action != Directions.STOP]
+                reverse = Actions.reverseDirection(direction)
+                if reverse in actions and len(actions) > 1: actions.remove(reverse)
+                byDirection[direction] = actions
+            ghostActions.append(byDirection)
+        # Leave the rules to fail on edge squares the way they always have
+        for position in edges: del cellIds[position]
+        return cellIds, cellPositions, neighborIds, possibleActions, ghostActions
 
     def isWall(self, pos):
         x, col = pos
@@ -83,6 +223,7 @@ class Layout:
         return pos
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
+        if self.visibility == None: self.initializeVisibilityMatrix()
         row, col = [int(x) for x in pacPos]
         return ghostPos in self.visibility[row][col][pacDirection]
 
@@ -90,7 +231,11 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        layout = Layout(self.layoutText[:])
+        layout.name = self.name
+        layout.filename = self.filename
+        layout.visibility = self.visibility
+        return layout
 
     def processLayoutText(self, layoutText):
         """
@@ -145,5 +290,8 @@ def getLayout(name, back = 2):
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)): return None
     f = open(fullname)
-    try: return Layout([line.strip() for line in f])
+    try: layout = Layout([line.strip() for line in f])
     finally: f.close()
+    layout.name = os.path.basename(fullname)[:-len('.lay')]
+    layout.filename = fullname
+    return layout
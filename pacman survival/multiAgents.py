@@ -14,10 +14,13 @@
 
 from util import manhattanDistance
 from game import Directions
+from game import Actions
 import random, util
-import sys
+import sys, time, math
+import ghostAgents
 
 from game import Agent
+from game import ZobristKeys
 
 def manhattanHeuristicMod(position1, position2, info={}):
     "The Manhattan distance heuristic for a PositionSearchProblem"
@@ -40,7 +43,7 @@ class ReflexAgent(Agent):
       it in any way you see fit, so long as you don't touch our method
       headers.
     """
-
+    readOnlyObservations = True
 
     def getAction(self, gameState):
         """
@@ -152,6 +155,169 @@ def scoreEvaluationFunction(currentGameState):
     """
     return currentGameState.getScore()
 
+class TranspositionTable:
+    """
+      A bounded table of search results for the adversarial search agents,
+      so a state reached again by another order of moves is not searched
+      again.  Results are keyed by the state's fingerprint, the agent to
+      move and the depth left to search (see key), and a value is an exact
+      one, or for alpha-beta a LOWER or UPPER bound on the exact one.
+
+      A key goes to one of size buckets, each with two entries: one that
+      keeps the deepest search stored in the bucket and one that is always
+      replaced by shallower searches.
+    """
+    EXACT, LOWER, UPPER = 0, 1, 2
+
+    def __init__(self, size):
+        self.size = size
+        self.deep = [None] * size
+        self.recent = [None] * size
+        self.probes = self.hits = self.stores = self.entries = 0
+
+    def key(self, gameState, agentIndex, depth):
+        return gameState.data.fingerprint() ^ ZobristKeys.turnKey(agentIndex, depth)
+
+    def probe(self, key):
+        "Returns the (key, depth, flag, value, action) entry stored for key, or None"
+        self.probes += 1
+        bucket = key % self.size
+        entry = self.deep[bucket]
+        if entry == None or entry[0] != key:
+            entry = self.recent[bucket]
+            if entry == None or entry[0] != key: return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, flag, value, action=None):
+        "Stores a search result, and the best action found, if there is one"
+        self.stores += 1
+        bucket = key % self.size
+        entry = (key, depth, flag, value, action)
+        deep = self.deep[bucket]
+        if deep == None or deep[0] == key or depth >= deep[1]:
+            #the deep entry this replaces is kept as the recent one
+            self.deep[bucket] = entry
+            if deep == None:
+                self.entries += 1
+                return
+            if deep[0] == key: return
+            entry = deep
+        if self.recent[bucket] == None: self.entries += 1
+        self.recent[bucket] = entry
+
+    def statistics(self):
+        hitRate = 0.0
+        if self.probes: hitRate = float(self.hits) / self.probes
+        return {'ttProbes': self.probes, 'ttHits': self.hits, 'ttHitRate': hitRate,
+                'ttStores': self.stores, 'ttEntries': self.entries}
+
+def agentCell(gameState, agentIndex):
+    "The position of an agent, or None for states that have no positions"
+    data = getattr(gameState, 'data', None)
+    if data == None: return None
+    return data.agentStates[agentIndex].configuration.pos
+
+class MoveOrdering:
+    """
+      Orders the actions alpha-beta searches at each node, and measures how
+      well the order prunes.  heuristics is a '+' separated list of
+      (-a ordering=hash+killer+history+static):
+
+        hash     the best action the transposition table has for the state
+        killer   the last two actions that caused a cutoff at the same ply
+        history  actions by how often they caused cutoffs (weighted by the
+                 depth searched under them), by agent, position and action
+        static   a cheap guess from positions: Pacman heads for food and
+                 away from ghosts, ghosts for Pacman unless they are scared
+
+      The actions the heuristics agree on least keep the order of
+      getLegalActions, which is the order without heuristics.  Whatever the
+      order, statistics() reports the effective branching factor (actions
+      searched per node expanded) and the share of the cutoffs made by the
+      first action searched.
+    """
+    HEURISTICS = ['hash', 'killer', 'history', 'static']
+
+    def __init__(self, heuristics=''):
+        names = [name for name in heuristics.split('+') if name]
+        for name in names:
+            if name not in MoveOrdering.HEURISTICS:
+                raise Exception, 'Unknown move ordering heuristic: ' + name
+        self.useHash = 'hash' in names
+        self.useKillers = 'killer' in names
+        self.useHistory = 'history' in names
+        self.useStatic = 'static' in names
+        self.active = len(names) > 0
+        self.killers = {}
+        self.history = util.Counter()
+        self.nodes = self.movesSearched = self.cutoffs = self.firstMoveCutoffs = 0
+
+    def newSearch(self):
+        "Forgets the killers of the last search and ages the history"
+        self.killers = {}
+        for key in self.history:
+            self.history[key] /= 2
+
+    def order(self, gameState, agentIndex, ply, actions, hashMove=None):
+        "Returns the actions in the order to search them"
+        if not self.active: return actions
+        cell = agentCell(gameState, agentIndex)
+        killers = self.killers.get(ply, [])
+        ranked = []
+        for index, action in enumerate(actions):
+            first = 0
+            if self.useHash and action == hashMove: first = 3
+            elif action in killers: first = 2 - killers.index(action)
+            history = 0
+            if self.useHistory: history = self.history.get((agentIndex, cell, action), 0)
+            static = 0
+            if self.useStatic and cell != None: static = self.staticScore(gameState, agentIndex, cell, action)
+            ranked.append((-first, -history, -static, index, action))
+        ranked.sort()
+        return [action for first, history, static, index, action in ranked]
+
+    def staticScore(self, gameState, agentIndex, cell, action):
+        dx, dy = Actions.directionToVector(action)
+        next = (cell[0] + dx, cell[1] + dy)
+        agentStates = gameState.data.agentStates
+        if agentIndex != 0:
+            distance = manhattanDistance(next, agentStates[0].configuration.pos)
+            if agentStates[agentIndex].scaredTimer > 0: return distance
+            return -distance
+        score = 0
+        if action == Directions.STOP: score -= 1
+        if gameState.data.food[int(next[0])][int(next[1])]: score += 2
+        for ghostState in agentStates[1:]:
+            if ghostState.scaredTimer == 0 and manhattanDistance(next, ghostState.configuration.pos) < 2:
+                score -= 10
+        return score
+
+    def record(self, gameState, agentIndex, ply, action, searched, remaining, cutoff):
+        """
+          Notes the result of a node: action is the best action, or the one
+          that caused a cutoff after searched actions.
+        """
+        self.nodes += 1
+        self.movesSearched += searched
+        if not cutoff: return
+        self.cutoffs += 1
+        if searched == 1: self.firstMoveCutoffs += 1
+        if self.useKillers:
+            killers = self.killers.setdefault(ply, [])
+            if action not in killers:
+                killers.insert(0, action)
+                del killers[2:]
+        if self.useHistory:
+            self.history[(agentIndex, agentCell(gameState, agentIndex), action)] += remaining * remaining
+
+    def statistics(self):
+        branching = firstMoveRate = 0.0
+        if self.nodes: branching = float(self.movesSearched) / self.nodes
+        if self.cutoffs: firstMoveRate = float(self.firstMoveCutoffs) / self.cutoffs
+        return {'nodesExpanded': self.nodes, 'cutoffs': self.cutoffs,
+                'effectiveBranchingFactor': branching, 'firstMoveCutoffRate': firstMoveRate}
+
 class MultiAgentSearchAgent(Agent):
     """
       This class provides some common elements to all of your
@@ -165,12 +331,24 @@ class MultiAgentSearchAgent(Agent):
       Note: this is an abstract class: one that should not be instantiated.  It's
       only partially specified, and designed to be extended.  Agent (game.py)
       is another abstract class.
+
+      With tt=N (-a tt=N) the agents keep a TranspositionTable of N buckets
+      across moves, and report its statistics as their metrics (pacman.py
+      --metrics).  The alpha-beta agents order their moves with a
+      MoveOrdering of the heuristics in ordering (-a ordering=killer+history)
+      and report its statistics too.
     """
+    readOnlyObservations = True
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', tt = '0', ordering = ''):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        self.table = None
+        if int(tt) > 0:
+            self.table = TranspositionTable(int(tt))
+            self.metrics = self.table.statistics()
+        self.ordering = MoveOrdering(ordering)
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -199,19 +377,27 @@ class MinimaxAgent(MultiAgentSearchAgent):
         maxInt = sys.maxint
         minInt = -maxInt
 
+        table = self.table
+
         def miniMax(gameState, depthCount):
           agentIndex = depthCount%agentNum
           #base case
           if depthCount >= self.depth*agentNum or gameState.isWin() or gameState.isLose():
             return self.evaluationFunction(gameState) #leaves
 
+          #the root is always searched, for its actions' values
+          if table != None and depthCount > 0:
+            key = table.key(gameState, agentIndex, self.depth*agentNum - depthCount)
+            entry = table.probe(key)
+            if entry != None:
+              return entry[3]
+
           #1 max layer for PacMan & agentNum-1 min layer
           if agentIndex != 0: #MIN
             result = maxInt
             for action in gameState.getLegalActions(agentIndex):
               nextGameState = gameState.generateSuccessor(agentIndex, action)
               result = min(result, miniMax(nextGameState, depthCount+1))
-            return result
           else: #MAX
             result = minInt
             for action in gameState.getLegalActions(agentIndex):
@@ -220,55 +406,318 @@ class MinimaxAgent(MultiAgentSearchAgent):
               #store each action's evaluated value
               if depthCount == 0:
                 actionsScore.append(result)
-            return result
-          
+
+          if table != None and depthCount > 0:
+            table.store(key, self.depth*agentNum - depthCount, table.EXACT, result)
+          return result
+
         result = miniMax(gameState, 0)
+        if table != None: self.metrics = table.statistics()
         return gameState.getLegalActions(0)[actionsScore.index(max(actionsScore))]
 
+class SearchTimeout(Exception):
+    "Raised inside a search when its time budget has run out"
+
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
       Your minimax agent with alpha-beta pruning (question 3)
     """
+    deadline = None # see alphaBeta
 
     def getAction(self, gameState):
         """
           Returns the minimax action using self.depth and self.evaluationFunction
         """
+        self.ordering.newSearch()
+        maxDepth = self.depth*gameState.getNumAgents()
+        value, line = self.alphaBeta(gameState, 0, maxDepth, -sys.maxint, sys.maxint, [])
+        self.metrics = self.ordering.statistics()
+        if self.table != None: self.metrics.update(self.table.statistics())
+        return line[0]
+
+    def alphaBeta(self, gameState, depthCount, maxDepth, alpha, beta, principalVariation):
+        """
+          Returns the value of gameState searched with alpha-beta pruning
+          until depthCount reaches maxDepth, and the line of actions leading
+          to it.  principalVariation is the line of the last search from
+          here, if this state is on it, and its first action is searched
+          first.  Raises SearchTimeout once self.deadline has passed, except
+          in a search only one round deep.
+        """
+        agentNum = gameState.getNumAgents()
+        agentIndex = depthCount%agentNum
+        if gameState.isWin() or gameState.isLose():
+          return self.evaluationFunction(gameState), []
+        if depthCount >= maxDepth:
+          self.hitDepthLimit = True
+          return self.evaluationFunction(gameState), []
+        if self.deadline != None and maxDepth > agentNum and time.time() > self.deadline:
+          raise SearchTimeout()
+
+        table = self.table
+        hashMove = None
+        if table != None and depthCount > 0:
+          key = table.key(gameState, agentIndex, maxDepth - depthCount)
+          entry = table.probe(key)
+          if entry != None:
+            #the stored search may have reached the depth limit
+            self.hitDepthLimit = True
+            flag, value, hashMove = entry[2], entry[3], entry[4]
+            if flag == table.EXACT:
+              return value, []
+            if flag == table.LOWER:
+              alpha = max(alpha, value)
+            else:
+              beta = min(beta, value)
+            if beta <= alpha:
+              return value, []
+          alphaStart, betaStart = alpha, beta
+
+        actions = self.ordering.order(gameState, agentIndex, depthCount, gameState.getLegalActions(agentIndex), hashMove)
+        if principalVariation and principalVariation[0] in actions:
+          actions.remove(principalVariation[0])
+          actions.insert(0, principalVariation[0])
+        else:
+          principalVariation = []
+
+        bestLine = []
+        searched = 0
+        if agentIndex != 0: #MIN
+          result = sys.maxint
+          for action in actions:
+            value, line = self.alphaBeta(gameState.generateSuccessor(agentIndex, action), depthCount+1,
+                                         maxDepth, alpha, beta, principalVariation[1:])
+            principalVariation = []
+            searched += 1
+            if value < result or not bestLine:
+              result, bestLine = value, [action] + line
+            beta = min(beta, result)
+            if beta <= alpha:
+              break
+        else: #MAX
+          result = -sys.maxint
+          for action in actions:
+            value, line = self.alphaBeta(gameState.generateSuccessor(agentIndex, action), depthCount+1,
+                                         maxDepth, alpha, beta, principalVariation[1:])
+            principalVariation = []
+            searched += 1
+            if value > result or not bestLine:
+              result, bestLine = value, [action] + line
+            alpha = max(alpha, result)
+            if beta <= alpha:
+              break
+        self.ordering.record(gameState, agentIndex, depthCount, bestLine[0], searched, maxDepth - depthCount, beta <= alpha)
+
+        if table != None and depthCount > 0:
+          #outside the window the search only bounds the value
+          if result <= alphaStart:
+            flag = table.UPPER
+          elif result >= betaStart:
+            flag = table.LOWER
+          else:
+            flag = table.EXACT
+          table.store(key, maxDepth - depthCount, flag, result, bestLine[0])
+        return result, bestLine
+
+class AnytimeAlphaBetaAgent(AlphaBetaAgent):
+    """
+      Alpha-beta search by iterative deepening: searches depth 1, 2, ...
+      until timeBudget seconds have passed (-a timeBudget=0.5), and plays the
+      best action of the deepest search that finished.  Depth only caps the
+      iterations here.  Each search tries the principal variation of the
+      one before it first, so it prunes most of what the last one looked at.
+      The searches are AlphaBetaAgent's, given a deadline.
+
+      After each move self.metrics has the depth the search reached, and
+      the average over the game so far.
+    """
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '100', tt = '0', ordering = '', timeBudget = '0.5'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, tt, ordering)
+        self.timeBudget = float(timeBudget)
+        self.depthsReached = []
+
+    def registerInitialState(self, gameState):
+        self.depthsReached = []
 
+    def getAction(self, gameState):
+        """
+          Returns the action of the deepest alpha-beta search that finishes
+          within the time budget.  Depth 1 is always searched to the end.
+        """
+        self.deadline = time.time() + self.timeBudget
+        self.ordering.newSearch()
         agentNum = gameState.getNumAgents()
-        actionsScore = []
-        maxInt = sys.maxint
-        minInt = -maxInt
+        principalVariation = []
+        depthReached = 0
+        for depth in range(1, self.depth + 1):
+          self.hitDepthLimit = False
+          try:
+            value, line = self.alphaBeta(gameState, 0, depth*agentNum, -sys.maxint, sys.maxint, principalVariation)
+          except SearchTimeout:
+            break
+          principalVariation = line
+          depthReached = depth
+          #every line ends the game before this depth, so deeper searches see no more
+          if not self.hitDepthLimit:
+            break
+
+        self.depthsReached.append(depthReached)
+        self.metrics = self.ordering.statistics()
+        self.metrics['depthReached'] = depthReached
+        self.metrics['averageDepth'] = float(sum(self.depthsReached)) / len(self.depthsReached)
+        if self.table != None: self.metrics.update(self.table.statistics())
+        return principalVariation[0]
+
+_rootSplit = None
+
+def initRootSplitWorker(gameState, alpha, evalFn, depth, tt, ordering):
+    """
+      Sets up a process to search subtrees for a ParallelAlphaBetaAgent: a
+      state of the game to unpack their states with, the shared alpha bound
+      and a searcher.
+    """
+    global _rootSplit
+    _rootSplit = (gameState, alpha, AlphaBetaAgent(evalFn, depth, tt, ordering))
 
-        def alphaBeta(gameState, depthCount, alpha, beta):
-          agentIndex = depthCount%agentNum
-          #base case
-          if depthCount >= self.depth*agentNum or gameState.isWin() or gameState.isLose():
-            return self.evaluationFunction(gameState)
+def searchSubtree(task):
+    """
+      Searches one (index, packed state, depthCount, maxDepth) subtree of a
+      ParallelAlphaBetaAgent search with the alpha bound it shares, and
+      returns (index, value, alpha, nodes expanded).  The value is exact if
+      it is above alpha, the bound read before searching, and otherwise only
+      an upper bound.
+    """
+    rootState, sharedAlpha, searcher = _rootSplit
+    index, packed, depthCount, maxDepth = task
+    gameState = rootState.unpack(rootState.data.layout, packed)
+    alpha = sharedAlpha.value
+    nodes = searcher.ordering.nodes
+    value, line = searcher.alphaBeta(gameState, depthCount, maxDepth, alpha, sys.maxint, [])
+    return index, value, alpha, searcher.ordering.nodes - nodes
+
+class ParallelAlphaBetaAgent(MultiAgentSearchAgent):
+    """
+      Alpha-beta search that splits the tree at the root over jobs worker
+      processes (-a jobs=4): every Pacman action is a subtree, or with
+      splitGhosts=1 every action of the first ghost after it.  The states
+      go to the workers packed (GameState.pack), and as each action's
+      value comes back it raises an alpha bound the workers share, so the
+      subtrees searched later prune as if searched after it.
+
+      A subtree searched with a bound only bounds its value.  That is enough
+      to rule an action out unless its bound ties the best value; such ties
+      are searched again, and the first of the best actions in the order
+      AlphaBetaAgent searches the root in is chosen.  The workers order their
+      moves and keep transposition tables as tt and ordering say.  Each one
+      keeps its own history table, so with history ordering the root order,
+      and the action chosen from equal ones, may differ from AlphaBetaAgent's;
+      without it the action is always AlphaBetaAgent's.  The workers start on
+      the first move of a game.  With jobs=1, or inside a pacman.py -j
+      worker, the subtrees are searched in this process.
+
+      After each move self.metrics has the nodes the search expanded, the
+      subtrees it was split into and the ties searched again.
+    """
 
-          if agentIndex != 0: #MIN
-            result = maxInt
-            for action in gameState.getLegalActions(agentIndex):
-              newGameState = gameState.generateSuccessor(agentIndex, action)
-              result = min(result, alphaBeta(newGameState, depthCount+1, alpha, beta))
-              beta = min(beta, result)
-              if beta <= alpha:
-                break
-            return result
-          else: #MAX
-            result = minInt
-            for action in gameState.getLegalActions(agentIndex):
-              newGameState = gameState.generateSuccessor(agentIndex, action)
-              result = max(result, alphaBeta(newGameState, depthCount+1, alpha, beta))
-              alpha = max(alpha, result)
-              if depthCount == 0:
-                actionsScore.append(result)
-              if beta <= alpha:
-                break
-            return result
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', tt = '0', ordering = '', jobs = '2', splitGhosts = '0'):
+        #the workers search, so only they need the table
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, '0', ordering)
+        self.workerSetup = (evalFn, depth, tt, ordering)
+        self.jobs = int(jobs)
+        self.splitGhosts = splitGhosts not in ['0', 'False', False]
+        self.searcher = AlphaBetaAgent(evalFn, depth)
+        self.pool = None
+        self.alpha = None
+        self.layout = None
+
+    def registerInitialState(self, gameState):
+        "Stops the workers of the last game; getAction starts new ones"
+        self.final(gameState)
+
+    def startWorkers(self, gameState):
+        "Starts the worker processes on the layout of gameState"
+        import multiprocessing
+        self.final(gameState)
+        self.alpha = multiprocessing.Value('d', -sys.maxint)
+        self.layout = gameState.data.layout
+        setup = (gameState, self.alpha) + self.workerSetup
+        if self.jobs > 1 and not multiprocessing.current_process().daemon:
+          self.pool = multiprocessing.Pool(self.jobs, initRootSplitWorker, setup)
+        else:
+          initRootSplitWorker(*setup)
+
+    def final(self, gameState):
+        "Stops the worker processes"
+        if self.pool != None:
+          self.pool.terminate()
+          self.pool.join()
+          self.pool = None
+        self.alpha = None
+        self.layout = None
 
-        result = alphaBeta(gameState, 0, minInt, maxInt)
-        return gameState.getLegalActions(0)[actionsScore.index(max(actionsScore))]
+    def getAction(self, gameState):
+        """
+          Returns the minimax action using self.depth and self.evaluationFunction
+        """
+        if self.alpha == None or gameState.data.layout is not self.layout:
+          self.startWorkers(gameState)
+        agentNum = gameState.getNumAgents()
+        maxDepth = self.depth*agentNum
+        self.ordering.newSearch()
+        rootActions = self.ordering.order(gameState, 0, 0, gameState.getLegalActions(0))
+
+        #tasks[i] is a subtree of the action owners[i]
+        tasks, owners = [], []
+        for index, action in enumerate(rootActions):
+          child = gameState.generateSuccessor(0, action)
+          if self.splitGhosts and agentNum > 1 and not (child.isWin() or child.isLose()):
+            for ghostAction in child.getLegalActions(1):
+              tasks.append((len(tasks), child.generateSuccessor(1, ghostAction).pack(), 2, maxDepth))
+              owners.append(index)
+          else:
+            tasks.append((len(tasks), child.pack(), 1, maxDepth))
+            owners.append(index)
+
+        self.alpha.value = -sys.maxint
+        if self.pool != None:
+          results = self.pool.imap_unordered(searchSubtree, tasks)
+        else:
+          results = (searchSubtree(task) for task in tasks)
+
+        #an action's value is the least of its subtrees', exact if they all are
+        values = [sys.maxint] * len(rootActions)
+        exact = [True] * len(rootActions)
+        pending = [owners.count(index) for index in range(len(rootActions))]
+        nodes = 0
+        try:
+          for task, value, alpha, expanded in results:
+            index = owners[task]
+            values[index] = min(values[index], value)
+            if value <= alpha: exact[index] = False
+            pending[index] -= 1
+            nodes += expanded
+            if pending[index] == 0 and exact[index] and values[index] > self.alpha.value:
+              self.alpha.value = values[index]
+        except:
+          #the workers may still be busy with the other subtrees
+          self.final(gameState)
+          raise
+
+        #bounds are never above the best exact value, but may tie it
+        best = max([value for value, isExact in zip(values, exact) if isExact])
+        reSearches = 0
+        for index, action in enumerate(rootActions):
+          if values[index] < best: continue
+          if exact[index]: break
+          reSearches += 1
+          nodes -= self.searcher.ordering.nodes
+          value, line = self.searcher.alphaBeta(gameState.generateSuccessor(0, action), 1, maxDepth, -sys.maxint, best, [])
+          nodes += self.searcher.ordering.nodes
+          if value >= best: break
+
+        self.metrics = {'nodesExpanded': nodes, 'subtrees': len(tasks), 'reSearches': reSearches}
+        return action
 
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
@@ -286,12 +735,21 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         actionsScore = []
         minInt = -sys.maxint
 
+        table = self.table
+
         def expectimax(gameState, depthCount):
           agentIndex = depthCount%agentNum
           #base case
           if depthCount >= self.depth*agentNum or gameState.isWin() or gameState.isLose():
             return self.evaluationFunction(gameState) #leaves
 
+          #the root is always searched, for its actions' values
+          if table != None and depthCount > 0:
+            key = table.key(gameState, agentIndex, self.depth*agentNum - depthCount)
+            entry = table.probe(key)
+            if entry != None:
+              return entry[3]
+
           #1 max layer for PacMan & agentNum-1 min layer
           if agentIndex != 0: #MIN
             successorsScore = []
@@ -300,8 +758,7 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
               result = expectimax(nextGameState, depthCount+1)
               successorsScore.append(result)
             #each state has equal probablity
-            expectedValue = sum([float(i)/len(successorsScore) for i in successorsScore])
-            return expectedValue
+            result = sum([float(i)/len(successorsScore) for i in successorsScore])
           else: #MAX
             result = minInt
             for action in gameState.getLegalActions(agentIndex):
@@ -310,11 +767,184 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
               #store each action's evaluated value
               if depthCount == 0:
                 actionsScore.append(result)
-            return result
-          
+
+          if table != None and depthCount > 0:
+            table.store(key, self.depth*agentNum - depthCount, table.EXACT, result)
+          return result
+
         result = expectimax(gameState, 0)
+        if table != None: self.metrics = table.statistics()
         return gameState.getLegalActions(0)[actionsScore.index(max(actionsScore))]
 
+class MCTSNode:
+    """
+      A state Pacman moves in, in the tree of an MCTSAgent.  edges has
+      [visits, total value, outcomes] for each action tried from it, where
+      outcomes are the nodes of the states the sampled ghost replies to the
+      action led to, by fingerprint.  The untried actions are shuffled
+      with rng.
+    """
+    def __init__(self, state, rng):
+        self.state = state
+        self.visits = 0
+        self.edges = {}
+        self.untried = []
+        if not (state.isWin() or state.isLose()):
+          self.untried = state.getLegalActions(0)
+          rng.shuffle(self.untried)
+
+class MCTSAgent(MultiAgentSearchAgent):
+    """
+      Monte Carlo tree search: each simulation walks down the tree choosing
+      Pacman's actions by UCT and sampling the ghosts' replies from a model
+      of them (-a ghost=RandomGhost, DirectionalGhost by default), adds the
+      first state it reaches that the tree doesn't have, and plays on from
+      there for rolloutDepth moves with Pacman moving by a cheap guess (see
+      rollout).  The evaluation
+      function's value of where the rollout ends is averaged into every
+      action on the way down.  The action simulated most is played.
+
+      The search runs iterations simulations per move, or as many as fit in
+      timeBudget seconds if that is given (-a timeBudget=0.2).  The subtree
+      of the state the game actually moved to is kept for the next move.
+      exploration weighs UCT's exploration term; values are scaled to the
+      range seen so far so that it doesn't depend on the evaluation
+      function.
+
+      After each move self.metrics has the simulations run and the ones the
+      reused subtree already had.  The simulations draw their random
+      numbers from a generator of the agent's own, seeded with seed, so
+      they leave the game's random stream alone.
+    """
+
+    def __init__(self, evalFn = 'betterEvaluationFunction', iterations = '200', timeBudget = '0',
+                 rolloutDepth = '5', exploration = '1.0', ghost = 'DirectionalGhost', seed = '0'):
+        MultiAgentSearchAgent.__init__(self, evalFn)
+        self.iterations = int(iterations)
+        self.timeBudget = float(timeBudget)
+        if self.iterations < 1 and self.timeBudget <= 0:
+          raise Exception, 'MCTSAgent needs at least 1 iteration or a time budget'
+        self.rolloutDepth = int(rolloutDepth)
+        self.exploration = float(exploration)
+        self.ghostType = getattr(ghostAgents, ghost)
+        self.rolloutPolicy = MoveOrdering('static')
+        self.random = random.Random(seed)
+        self.ghosts = []
+        self.registerInitialState(None)
+
+    def registerInitialState(self, gameState):
+        "Forgets the tree of the last game"
+        self.root = None
+        self.lastAction = None
+        self.lowest = self.highest = None
+
+    def getAction(self, gameState):
+        """
+          Returns the action simulated most from gameState
+        """
+        if len(self.ghosts) != gameState.getNumAgents() - 1:
+          self.ghosts = [self.ghostType(index) for index in range(1, gameState.getNumAgents())]
+        root = self.reroot(gameState)
+        reused = root.visits
+        deadline = time.time() + self.timeBudget
+        simulations = 0
+        while True:
+          if self.timeBudget > 0:
+            if simulations > 0 and time.time() >= deadline: break
+          elif simulations >= self.iterations: break
+          self.simulate(root)
+          simulations += 1
+
+        #the order of getLegalActions breaks ties
+        visits = [(root.edges[action][0], -index, action) for index, action in
+                  enumerate(gameState.getLegalActions(0)) if action in root.edges]
+        self.root, self.lastAction = root, max(visits)[2]
+        self.metrics = {'simulations': simulations, 'reusedSimulations': reused}
+        return self.lastAction
+
+    def reroot(self, gameState):
+        "The node of gameState in the tree of the last move, or a new one"
+        if self.root != None and self.lastAction in self.root.edges:
+          node = self.root.edges[self.lastAction][2].get(gameState.data.fingerprint())
+          if node != None: return node
+        return MCTSNode(gameState, self.random)
+
+    def simulate(self, root):
+        node = root
+        path = []
+        while True:
+          node.visits += 1
+          if node.state.isWin() or node.state.isLose():
+            value = self.evaluationFunction(node.state)
+            break
+          if node.untried:
+            action = node.untried.pop()
+            node.edges[action] = [0, 0.0, {}]
+          else:
+            action = self.select(node)
+          path.append(node.edges[action])
+          state = self.ghostReplies(node.state.generateSuccessor(0, action))
+          outcomes = node.edges[action][2]
+          key = state.data.fingerprint()
+          if key not in outcomes:
+            node = outcomes[key] = MCTSNode(state, self.random)
+            node.visits += 1
+            value = self.rollout(state)
+            break
+          node = outcomes[key]
+
+        if self.lowest == None: self.lowest = self.highest = value
+        self.lowest, self.highest = min(self.lowest, value), max(self.highest, value)
+        for edge in path:
+          edge[0] += 1
+          edge[1] += value
+
+    def select(self, node):
+        "The action of node with the highest upper confidence bound"
+        scale = self.highest - self.lowest
+        logVisits = math.log(node.visits)
+        best, bestBound = None, None
+        for action, (visits, total, outcomes) in node.edges.items():
+          mean = 0.5
+          if scale > 0: mean = (total / visits - self.lowest) / scale
+          bound = mean + self.exploration * math.sqrt(logVisits / visits)
+          if bestBound == None or bound > bestBound:
+            best, bestBound = action, bound
+        return best
+
+    def ghostReplies(self, state):
+        "The state after each ghost has made a move sampled from the model"
+        for ghost in self.ghosts:
+          if state.isWin() or state.isLose(): break
+          state = state.generateSuccessor(ghost.index, self.sample(ghost.getDistribution(state)))
+        return state
+
+    def sample(self, distribution):
+        "An action drawn from a ghost's distribution, like util.sample"
+        if len(distribution) == 0: return Directions.STOP
+        items = sorted(distribution.items())
+        choice = self.random.random() * sum([probability for action, probability in items])
+        for action, probability in items:
+          choice -= probability
+          if choice < 0: break
+        return action
+
+    def rollout(self, state):
+        """
+          The value of the state after rolloutDepth moves from state, Pacman
+          choosing at random among the moves MoveOrdering's static guess
+          likes best
+        """
+        for move in range(self.rolloutDepth):
+          if state.isWin() or state.isLose(): break
+          cell = agentCell(state, 0)
+          scored = [(self.rolloutPolicy.staticScore(state, 0, cell, action), action)
+                    for action in state.getLegalActions(0)]
+          best = max(scored)[0]
+          action = self.random.choice([action for score, action in scored if score == best])
+          state = self.ghostReplies(state.generateSuccessor(0, action))
+        return self.evaluationFunction(state)
+
 def betterEvaluationFunction(currentGameState):
   """
   Your extreme ghost-hunting, pellet-nabbing, food-gobbling, unstoppable
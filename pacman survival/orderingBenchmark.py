@@ -0,0 +1,147 @@
+# orderingBenchmark.py
+# --------------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+Measures how well the move orderings of multiAgents.MoveOrdering prune
+alpha-beta search, on the alpha-beta game trees in test_cases/q3 and on
+positions from a game on a real layout.
+
+For every ordering it reports the nodes AlphaBetaAgent expanded, the
+effective branching factor (actions searched per node expanded), the share
+of cutoffs made by the first action searched and the time taken.  Orderings
+with the hash heuristic search the layout positions with a transposition
+table; the tree states have no fingerprints to key one with.
+
+  > python orderingBenchmark.py -l mediumClassic -d 3 -n 20
+  > python orderingBenchmark.py -o killer,killer+history+static
+"""
+
+import optparse
+import os
+import random
+import sys
+import time
+import layout
+import pacman
+import ghostAgents
+import multiAgents
+import textDisplay
+import util
+import testParser
+import multiagentTestClasses
+
+ORDERINGS = ['', 'static', 'killer', 'history', 'killer+history', 'hash+killer+history+static']
+COLUMNS = [('positions', 'name', '%s'), ('ordering', 'ordering', '%s'),
+           ('expanded', 'nodesExpanded', '%d'), ('branching', 'effectiveBranchingFactor', '%.2f'),
+           ('first-move cutoffs', 'firstMoveCutoffRate', '%.2f'), ('time', 'time', '%.3f')]
+
+def makeAgent(ordering, depth, tableSize):
+    tt = 0
+    if 'hash' in ordering.split('+'): tt = tableSize
+    return multiAgents.AlphaBetaAgent(depth=depth, tt=tt, ordering=ordering)
+
+def treeCases(directory='test_cases/q3'):
+    "The (depth, start state) of the alpha-beta game tree tests"
+    cases = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.test'): continue
+        testDict = testParser.TestParser(os.path.join(directory, name)).parse()
+        if testDict['class'] != 'GraphGameTreeTest': continue
+        problem = multiagentTestClasses.parseTreeProblem(testDict)
+        cases.append((int(testDict['depth']), problem.startState))
+    return cases
+
+def layoutPositions(layoutName, numPositions, seed='cs188'):
+    """
+    The states Pacman moved in during a game on the layout between a depth 2
+    AlphaBetaAgent and DirectionalGhosts, up to numPositions of them.
+    """
+    random.seed(seed)
+    rules = pacman.ClassicGameRules()
+    ghosts = [ghostAgents.DirectionalGhost(i + 1) for i in range(4)]
+    game = rules.newGame(layout.getLayout(layoutName), multiAgents.AlphaBetaAgent(depth=2), ghosts,
+                         textDisplay.NullGraphics(), True, False, True)
+    game.run()
+    state, positions = rules.initialState, []
+    for agentIndex, action in game.moveHistory:
+        if agentIndex == 0: positions.append(state)
+        state = state.generateSuccessor(agentIndex, action)
+    return positions[:numPositions]
+
+def measure(name, ordering, cases, tableSize):
+    """
+    Searches every (depth, state) case with a fresh agent per depth and
+    returns the ordering statistics summed over the cases.
+    """
+    agents = {}
+    start = time.time()
+    for depth, state in cases:
+        if depth not in agents: agents[depth] = makeAgent(ordering, depth, tableSize)
+        agents[depth].getAction(state)
+    nodes = moves = cutoffs = firstMoveCutoffs = 0
+    for agent in agents.values():
+        nodes += agent.ordering.nodes
+        moves += agent.ordering.movesSearched
+        cutoffs += agent.ordering.cutoffs
+        firstMoveCutoffs += agent.ordering.firstMoveCutoffs
+    result = {'name': name, 'ordering': ordering or 'none', 'nodesExpanded': nodes,
+              'time': time.time() - start, 'effectiveBranchingFactor': 0.0, 'firstMoveCutoffRate': 0.0}
+    if nodes: result['effectiveBranchingFactor'] = float(moves) / nodes
+    if cutoffs: result['firstMoveCutoffRate'] = float(firstMoveCutoffs) / cutoffs
+    return result
+
+def readCommand(argv):
+    usageStr = """
+    USAGE:      python orderingBenchmark.py <options>
+    EXAMPLES:   (1) python orderingBenchmark.py
+                    - compares the orderings on the q3 trees and mediumClassic
+                (2) python orderingBenchmark.py -l smallClassic -d 4 -o ,killer+history
+                    - compares no ordering with killers and history at depth 4
+    """
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-o', '--orderings', dest='orderings', default=','.join(ORDERINGS),
+                      help='Comma separated orderings to compare, each a + separated list of heuristics (default: %default)')
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='The layout to take positions from (default: %default)')
+    parser.add_option('-n', '--positions', dest='positions', type='int', default=20,
+                      help='Number of positions to search (default: %default)')
+    parser.add_option('-d', '--depth', dest='depth', type='int', default=3,
+                      help='Depth to search the positions to (default: %default)')
+    parser.add_option('--tt', dest='tableSize', type='int', default=100000,
+                      help='Transposition table buckets for the hash heuristic (default: %default)')
+    parser.add_option('--no-trees', action='store_false', dest='trees', default=True,
+                      help='Skip the test_cases/q3 trees')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+def runBenchmark(options):
+    import __main__
+    __main__.__dict__['_display'] = textDisplay.NullGraphics()
+    orderings = options.orderings.split(',')
+    results = []
+    if options.trees:
+        cases = treeCases()
+        for ordering in orderings:
+            results.append(measure('q3 trees', ordering, cases, 0))
+    if options.positions > 0:
+        cases = [(options.depth, state) for state in layoutPositions(options.layout, options.positions)]
+        for ordering in orderings:
+            results.append(measure(options.layout, ordering, cases, options.tableSize))
+    print util.formatTable(results, COLUMNS)
+    return results
+
+if __name__ == '__main__':
+    runBenchmark(readCommand(sys.argv[1:]))
@@ -161,36 +161,145 @@ class PriorityQueue:
       in quick retrieval of the lowest-priority item in the queue. This
       data structure allows O(1) access to the lowest-priority item.
 
-      Note that this PriorityQueue does not allow you to change the priority
-      of an item.  However, you may insert the same item multiple times with
-      different priorities.
+      Note that push does not change the priority of an item already in the
+      queue: you may insert the same item multiple times with different
+      priorities.  update, remove and membership tests scan the heap.
+
+      With indexed=True the queue keeps a map from each item to its slot in
+      the binary heap, so push, pop, update and remove are O(log n) and
+      membership tests O(1).  Items must then be hashable and each item is
+      held at most once; pushing an item that is already in the queue
+      behaves like update.
+
+      Items with equal priority are popped in the order they were pushed.
     """
-    def  __init__(self):
+    def  __init__(self, indexed=False):
         self.heap = []
         self.count = 0
+        self.indexed = indexed
+        # item -> heap slot, kept only when indexed
+        self.slots = {}
 
     def push(self, item, priority):
-        # FIXME: restored old behaviour to check against old results better
-        # FIXED: restored to stable behaviour
-        entry = (priority, self.count, item)
-        # entry = (priority, item)
-        heapq.heappush(self.heap, entry)
+        if not self.indexed:
+            heapq.heappush(self.heap, [priority, self.count, item])
+            self.count += 1
+            return
+        if item in self.slots:
+            self.update(item, priority)
+            return
+        self.heap.append([priority, self.count, item])
         self.count += 1
+        self.slots[item] = len(self.heap) - 1
+        self._siftUp(len(self.heap) - 1)
 
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
-        #  (_, item) = heapq.heappop(self.heap)
+        if not self.indexed:
+            return heapq.heappop(self.heap)[2]
+        (_, _, item) = self._removeAt(0)
         return item
 
     def isEmpty(self):
         return len(self.heap) == 0
 
+    def update(self, item, priority):
+        # If item already in priority queue with higher priority, update its priority.
+        # If item already in priority queue with equal or lower priority, do nothing.
+        # If item not in priority queue, do the same thing as self.push.
+        if not self.indexed:
+            for index, entry in enumerate(self.heap):
+                if entry[2] == item:
+                    if entry[0] <= priority:
+                        break
+                    entry[0] = priority
+                    heapq.heapify(self.heap)
+                    break
+            else:
+                self.push(item, priority)
+            return
+        if item not in self.slots:
+            self.push(item, priority)
+            return
+        slot = self.slots[item]
+        if self.heap[slot][0] <= priority:
+            return
+        self.heap[slot][0] = priority
+        self._siftUp(slot)
+
+    def remove(self, item):
+        "Removes item from the queue.  Raises KeyError if it is not queued."
+        if self.indexed:
+            self._removeAt(self.slots[item])
+            return
+        for index, entry in enumerate(self.heap):
+            if entry[2] == item:
+                last = self.heap.pop()
+                if index < len(self.heap):
+                    self.heap[index] = last
+                    heapq.heapify(self.heap)
+                return
+        raise KeyError(item)
+
+    def __contains__(self, item):
+        if self.indexed:
+            return item in self.slots
+        for entry in self.heap:
+            if entry[2] == item:
+                return True
+        return False
+
+    def _removeAt(self, slot):
+        heap, slots = self.heap, self.slots
+        entry = heap[slot]
+        last = heap.pop()
+        del slots[entry[2]]
+        if slot < len(heap):
+            heap[slot] = last
+            slots[last[2]] = slot
+            if last < entry:
+                self._siftUp(slot)
+            else:
+                self._siftDown(slot)
+        return entry
+
+    def _siftUp(self, slot):
+        heap, slots = self.heap, self.slots
+        entry = heap[slot]
+        while slot > 0:
+            parentSlot = (slot - 1) >> 1
+            parent = heap[parentSlot]
+            if not entry < parent:
+                break
+            heap[slot] = parent
+            slots[parent[2]] = slot
+            slot = parentSlot
+        heap[slot] = entry
+        slots[entry[2]] = slot
+
+    def _siftDown(self, slot):
+        heap, slots = self.heap, self.slots
+        size = len(heap)
+        entry = heap[slot]
+        child = 2 * slot + 1
+        while child < size:
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if not heap[child] < entry:
+                break
+            heap[slot] = heap[child]
+            slots[heap[slot][2]] = slot
+            slot = child
+            child = 2 * slot + 1
+        heap[slot] = entry
+        slots[entry[2]] = slot
+
 class PriorityQueueWithFunction(PriorityQueue):
     """
     Implements a priority queue with the same push/pop signature of the
     Queue and the Stack classes. This is designed for drop-in replacement for
     those two classes. The caller has to provide a priority function, which
     extracts each item's priority.
+
     """
     def  __init__(self, priorityFunction):
         "priorityFunction (item) -> priority"
@@ -570,6 +679,17 @@ def lookup(name, namespace):
         if len(options) > 1: raise Exception, 'Name conflict for %s'
         raise Exception, '%s not found as a method or class' % name
 
+def formatTable(records, columns):
+    """
+    Formats dictionaries as a text table with one row per record.  columns
+    is a list of (title, key, format) and a record without the key shows '-'.
+    """
+    rows = [[title for title, key, format in columns]]
+    for record in records:
+        rows.append([key in record and format % record[key] or '-' for title, key, format in columns])
+    widths = [max([len(row[i]) for row in rows]) for i in range(len(columns))]
+    return '\n'.join(['  '.join([cell.ljust(width) for cell, width in zip(row, widths)]).rstrip() for row in rows])
+
 def pause():
     """
     Pauses the output stream awaiting user feedback.